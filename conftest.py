@@ -0,0 +1,27 @@
+from unittest import mock
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def commit_immediately(request):
+    """Изоляция кэша для тестов с маркером django_db.
+
+    База между такими тестами откатывается или очищается, а кэш нет,
+    поэтому он очищается перед каждым тестом. Без transaction=True
+    pytest-django откатывает транзакцию теста, не фиксируя её, и
+    отложенные до фиксации изменения кэша выполняются сразу. Классы
+    Django TestCase маркера не имеют и настраивают это сами.
+    """
+    marker = request.node.get_closest_marker('django_db')
+    if marker is None:
+        yield
+        return
+    from django.core.cache import cache
+
+    cache.clear()
+    if marker.kwargs.get('transaction') or (marker.args and marker.args[0]):
+        yield
+        return
+    with mock.patch('django.db.transaction.on_commit', lambda func: func()):
+        yield
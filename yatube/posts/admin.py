@@ -1,14 +1,97 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.actions import delete_selected
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
 
 from .models import Group, Post, Comment, Follow
+from .pagination import BoundedCountPaginator
+from .search import get_backend, terms
 
+BULK_CHUNK_SIZE = 1000
 
-class PostAdmin(admin.ModelAdmin):
+
+def delete_in_chunks(modeladmin, request, queryset):
+    """Удаляет выбранное пачками по первичному ключу.
+
+    Страницу подтверждения показывает стандартное delete_selected, а
+    после подтверждения оно собрало бы все объекты и каскады в памяти
+    и держало одну транзакцию; здесь каждая пачка — своя транзакция.
+    Права и защищённые связи проверяются для каждой пачки, удаление
+    каждого объекта пишется в журнал админки, как у delete_selected.
+    """
+    if not request.POST.get('post'):
+        return delete_selected(modeladmin, request, queryset)
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    deleted = 0
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(
+            pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:BULK_CHUNK_SIZE])
+        if not pks:
+            break
+        with transaction.atomic():
+            # Диапазон pk, а не IN: список из тысячи id SQLite до 3.32
+            # не принимает
+            objs = chunk.filter(pk__lte=pks[-1])
+            _, _, perms_needed, protected = modeladmin.get_deleted_objects(
+                objs, request)
+            if perms_needed:
+                raise PermissionDenied
+            if protected:
+                modeladmin.message_user(
+                    request, f'Удалено объектов: {deleted}; остальные '
+                    f'связаны с защищёнными объектами', messages.ERROR)
+                return None
+            for obj in objs:
+                modeladmin.log_deletion(request, obj, str(obj))
+            modeladmin.delete_queryset(request, objs)
+        deleted += len(pks)
+        last_pk = pks[-1]
+    modeladmin.message_user(
+        request, f'Удалено объектов: {deleted}', messages.SUCCESS)
+    return None
+
+
+delete_in_chunks.short_description = 'Удалить выбранные (пачками)'
+delete_in_chunks.allowed_permissions = ('delete',)
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список без полного COUNT и без N+1, удаление пачками."""
+    paginator = BoundedCountPaginator
+    show_full_result_count = False
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Шаблон подтверждения отправляет action=delete_selected, поэтому
+        # пачечное удаление занимает место стандартного под тем же именем
+        if 'delete_selected' in actions:
+            actions['delete_selected'] = (
+                delete_in_chunks, 'delete_selected',
+                delete_in_chunks.short_description)
+        return actions
+
+
+class PostAdmin(ScalableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author')
+    list_select_related = ('author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    raw_id_fields = ('author', 'group')
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE по всей таблице — лучшие совпадения из индекса,
+        # подзапросом, а не списком id в параметрах
+        words = terms(search_term)
+        if not words:
+            return queryset, False
+        limit = getattr(settings, 'SEARCH_ADMIN_LIMIT', 1000)
+        ids = get_backend().ranked_subquery(words, limit)
+        return queryset.filter(pk__in=ids), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('pk', 'title', 'description', 'slug')
@@ -17,16 +100,21 @@ class GroupAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = ('post', 'text', 'author', 'created')
-    search_fields = ('text',)
-    list_filter = ('text',)
+    list_select_related = ('post', 'author')
+    # Точное совпадение по уникальному username вместо LIKE по тексту
+    search_fields = ('=author__username',)
+    list_filter = ('created',)
+    raw_id_fields = ('post', 'author')
     empty_value_display = '-пусто-'
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ('author', 'user')
-    search_fields = ('user',)
+    list_select_related = ('author', 'user')
+    search_fields = ('=user__username', '=author__username')
+    raw_id_fields = ('user', 'author')
     empty_value_display = '-пусто-'
 
 
@@ -0,0 +1,125 @@
+"""JSON-версии лент для мобильных клиентов.
+
+Querysets те же, что у HTML-страниц (posts/feeds.py), страницы листаются
+только курсором. Ответ собирается из словарей без шаблонов: fields=
+ограничивает набор полей, а миниатюры всей страницы находятся одним
+обращением к хранилищу sorl, как в HTML-лентах.
+"""
+from django.conf import settings
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+
+from . import feeds, thumbnails
+from .conditional import AUTHOR_SCOPE, GROUP_SCOPE, INDEX_SCOPE, page_etag
+from .decorators import query_budget
+from .models import Group, User
+from .pagecache import anonymous_cache
+from .pagination import CURSOR_KEYS, CursorPaginator
+
+
+def thumbnail_urls(post):
+    return {
+        str(width): thumbnail.url
+        for width, thumbnail in sorted(post.card_thumbnails.items())
+    }
+
+
+FIELDS = {
+    'id': lambda post: post.pk,
+    'url': lambda post: reverse(
+        'post', args=(post.author.username, post.pk)),
+    'text': lambda post: post.text,
+    'pub_date': lambda post: post.pub_date.isoformat(),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'comment_count': lambda post: post.comment_count,
+    'image': lambda post: post.image.url if post.image else None,
+    'width': lambda post: post.width,
+    'height': lambda post: post.height,
+    'thumbnails': thumbnail_urls,
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+def requested_fields(request):
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(FIELDS)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def page_size(request):
+    limit = getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(request.GET.get('limit', settings.PER_PAGE_COUNT))
+    except ValueError:
+        raise BadRequest('limit должен быть числом')
+    return max(1, min(size, limit))
+
+
+def error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def feed_response(request, posts, keys=CURSOR_KEYS):
+    try:
+        fields = requested_fields(request)
+        paginator = CursorPaginator(posts, page_size(request), keys)
+    except BadRequest as bad:
+        return error(str(bad))
+    page = paginator.get_page(
+        after=request.GET.get('after'), before=request.GET.get('before'))
+    if 'thumbnails' in fields:
+        thumbnails.attach_thumbnails(page)
+    serializers = [(name, FIELDS[name]) for name in fields]
+    return JsonResponse(
+        {
+            'results': [
+                {name: serialize(post) for name, serialize in serializers}
+                for post in page
+            ],
+            'next': page.next_cursor,
+            'previous': page.previous_cursor,
+        },
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+@query_budget(3)
+@page_etag(INDEX_SCOPE)
+@anonymous_cache(INDEX_SCOPE)
+def index(request):
+    return feed_response(request, feeds.index_feed())
+
+
+@query_budget(4)
+@page_etag(GROUP_SCOPE)
+@anonymous_cache(GROUP_SCOPE)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, feeds.group_feed(group))
+
+
+@query_budget(4)
+@page_etag(AUTHOR_SCOPE)
+@anonymous_cache(AUTHOR_SCOPE)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, feeds.author_feed(author))
+
+
+@query_budget(4)
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return error('Требуется вход', status=401)
+    return feed_response(
+        request, feeds.subscriptions_feed(request.user),
+        feeds.SUBSCRIPTIONS_KEYS)
@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class PostConfig(AppConfig):
-    name = 'posts',
+    name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa
+        from yatube.sqlite import configure_connection
+        connection_created.connect(
+            configure_connection, dispatch_uid='yatube.sqlite')
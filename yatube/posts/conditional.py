@@ -0,0 +1,77 @@
+"""Условные GET-запросы по версиям страниц.
+
+ETag страницы собирается из счётчиков версий её областей (лента,
+группа, автор, пост), которые увеличивают сигналы при записи, и из
+пользователя: меню и кнопки различаются для разных посетителей.
+Совпавший If-None-Match получает 304 до запросов лент и шаблонов.
+Ответ, прочитанный с реплики, ETag не получает: версии уже новые, а
+данные могли отстать. Страницы гостей при промахе кэша читаются с
+default (pagecache) и ETag сохраняют.
+"""
+import hashlib
+from functools import wraps
+
+from django.views.decorators.http import etag
+
+from yatube.replicas import read_replica
+
+from . import versions
+
+SITE_SCOPE = 'page:site'
+INDEX_SCOPE = 'page:index'
+GROUP_SCOPE = 'page:group:{slug}'
+AUTHOR_SCOPE = 'page:author:{username}'
+POST_SCOPE = 'page:post:{post_id}'
+
+
+def post_pages(post):
+    """Области страниц, на которых показан пост."""
+    scopes = [
+        INDEX_SCOPE,
+        AUTHOR_SCOPE.format(username=post.author.username),
+        POST_SCOPE.format(post_id=post.pk),
+    ]
+    if post.group_id:
+        scopes.append(GROUP_SCOPE.format(slug=post.group.slug))
+    old_group_slug = getattr(post, '_old_group_slug', None)
+    if old_group_slug:
+        scopes.append(GROUP_SCOPE.format(slug=old_group_slug))
+    return scopes
+
+
+def page_versions(request, scope_templates, kwargs):
+    """Версии областей страницы, один раз за запрос.
+
+    Их читают и ETag, и кэш ответов для гостей, поэтому результат
+    запоминается на объекте запроса.
+    """
+    cached = getattr(request, '_page_versions', None)
+    if cached is None:
+        scopes = [SITE_SCOPE] + [
+            template.format(**kwargs) for template in scope_templates]
+        current = versions.get_versions(scopes)
+        cached = request._page_versions = [
+            f'{scope}={current[scope]}' for scope in scopes]
+    return cached
+
+
+def page_etag(*scope_templates):
+    """Декоратор: ETag из версий областей, шаблоны получают kwargs URL."""
+    def etag_func(request, **kwargs):
+        user = request.user.pk if request.user.is_authenticated else 'anon'
+        raw = '|'.join(
+            [str(user), request.get_full_path()]
+            + page_versions(request, scope_templates, kwargs))
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def decorator(view):
+        conditional = etag(etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            if read_replica() and response.has_header('ETag'):
+                del response['ETag']
+            return response
+        return wrapper
+    return decorator
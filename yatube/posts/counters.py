@@ -0,0 +1,156 @@
+"""Денормализованные счётчики, поддерживаемые при записи."""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, MediaFile, Post, User
+from .storage import delete_with_thumbnails
+
+
+def change_comment_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=F('comment_count') + delta)
+
+
+def actual_comment_counts():
+    counts = (
+        Comment.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('id'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def comment_count_drift():
+    """Посты, у которых сохранённый счётчик расходится с Comment."""
+    return (
+        Post.objects.annotate(actual=actual_comment_counts())
+        .exclude(comment_count=F('actual'))
+    )
+
+
+def rebuild_comment_counts():
+    return Post.objects.update(comment_count=actual_comment_counts())
+
+
+def change_author_stats(user_id, **deltas):
+    """Сдвигает счётчики строки AuthorStats.
+
+    Строки пользователей, созданных до 0014, заполняет миграция, новых —
+    сигнал post_save User, поэтому запись никогда не считает агрегаты.
+    """
+    AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def _count_for(model, field):
+    # Без order_by() поля Meta.ordering попадают в GROUP BY и подзапрос
+    # возвращает по строке на каждую дату
+    counts = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def actual_author_stats():
+    return User.objects.annotate(
+        actual_followers=_count_for(Follow, 'author'),
+        actual_following=_count_for(Follow, 'user'),
+        actual_posts=_count_for(Post, 'author'),
+    )
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', 10000)
+
+
+def author_stats(user_id):
+    stats = AuthorStats.objects.filter(user_id=user_id).first()
+    if stats is not None:
+        return stats
+    # Запасной путь для пользователей, созданных мимо сигналов
+    # (bulk_create). Строка вставляется до подсчёта в той же транзакции:
+    # в SQLite вставка берёт блокировку записи, поэтому параллельная
+    # подписка либо уже видна подсчёту, либо сдвинет готовую строку
+    with transaction.atomic():
+        stats, created = AuthorStats.objects.get_or_create(user_id=user_id)
+        if created:
+            actual = actual_author_stats().get(pk=user_id)
+            stats.followers_count = actual.actual_followers
+            stats.following_count = actual.actual_following
+            stats.posts_count = actual.actual_posts
+            stats.pull_timeline = actual.actual_followers > fanout_limit()
+            stats.save()
+    return stats
+
+
+@transaction.atomic
+def rebuild_author_stats(batch_size=1000):
+    AuthorStats.objects.all().delete()
+    total = 0
+    batch = []
+    for user in actual_author_stats().iterator(chunk_size=batch_size):
+        batch.append(AuthorStats(
+            user_id=user.pk,
+            followers_count=user.actual_followers,
+            following_count=user.actual_following,
+            posts_count=user.actual_posts,
+            pull_timeline=user.actual_followers > fanout_limit(),
+        ))
+        if len(batch) >= batch_size:
+            AuthorStats.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    AuthorStats.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def acquire_image(name):
+    ref, created = MediaFile.objects.get_or_create(
+        name=name, defaults={'refcount': 1})
+    if not created:
+        MediaFile.objects.filter(pk=ref.pk).update(
+            refcount=F('refcount') + 1)
+
+
+def release_image(name):
+    """Снимает ссылку; файл без ссылок удаляется после фиксации."""
+    MediaFile.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1)
+    transaction.on_commit(lambda: purge_image(name))
+
+
+@transaction.atomic
+def rebuild_image_refs(batch_size=1000):
+    """Пересчитывает MediaFile по Post.image, файлы не трогает."""
+    MediaFile.objects.all().delete()
+    counts = (
+        Post.objects.exclude(image='').exclude(image=None)
+        .order_by().values('image').annotate(total=Count('id'))
+        .values_list('image', 'total')
+    )
+    total = 0
+    batch = []
+    for name, refs in counts.iterator(chunk_size=batch_size):
+        batch.append(MediaFile(name=name, refcount=refs))
+        if len(batch) >= batch_size:
+            MediaFile.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    MediaFile.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def purge_image(name):
+    deleted, _ = MediaFile.objects.filter(name=name, refcount=0).delete()
+    # Повторная проверка по Post защищает от параллельной загрузки тех же
+    # байтов между уменьшением счётчика и удалением файла
+    if deleted and not Post.objects.filter(image=name).exists():
+        delete_with_thumbnails(name)
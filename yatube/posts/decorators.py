@@ -0,0 +1,51 @@
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+
+def query_budget(queries):
+    """Объявляет предельное число SQL-запросов для представления.
+
+    Само ограничение не применяется во время работы — бюджеты читает
+    тест posts.tests.test_queries и падает при превышении.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def is_lock_error(error):
+    return 'database is locked' in str(error)
+
+
+def retry_on_lock(view):
+    """Выполняет представление в транзакции и повторяет её при блокировке.
+
+    SQLite отвечает «database is locked», когда отложенная транзакция не
+    может получить блокировку на запись; ожидание busy_timeout в этом
+    случае не помогает, и транзакцию надо начать заново. Повторов не
+    больше DATABASE_LOCK_RETRIES, паузы растут экспоненциально от
+    DATABASE_LOCK_BACKOFF секунд. Внутри чужой транзакции повторять
+    нельзя, и представление вызывается как есть. Кэш сигналы меняют
+    только после фиксации, поэтому откаченная попытка его не трогает.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if connection.in_atomic_block:
+            return view(request, *args, **kwargs)
+        retries = getattr(settings, 'DATABASE_LOCK_RETRIES', 3)
+        backoff = getattr(settings, 'DATABASE_LOCK_BACKOFF', 0.05)
+        for attempt in range(retries + 1):
+            try:
+                with transaction.atomic():
+                    return view(request, *args, **kwargs)
+            except OperationalError as error:
+                if attempt == retries or not is_lock_error(error):
+                    raise
+            # Случайная добавка разводит воркеры, упёршиеся друг в друга
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+    return wrapper
@@ -0,0 +1,91 @@
+"""Потоковая выгрузка постов и комментариев в NDJSON или CSV.
+
+Записи совпадают по формату с входом команды import_posts. Строки
+читаются через values() и iterator(chunk_size), поэтому память не
+зависит от объёма выгрузки.
+"""
+import csv
+import json
+
+from django.conf import settings
+
+from .models import Comment, Post
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+CSV_COLUMNS = (
+    'type', 'id', 'post', 'author', 'group', 'text', 'pub_date', 'created',
+    'image',
+)
+
+
+def default_chunk_size():
+    return getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+
+def post_records(posts, chunk_size=None):
+    rows = (
+        posts.order_by('pk')
+        .values_list('pk', 'author__username', 'group__slug', 'text',
+                     'pub_date', 'image')
+        .iterator(chunk_size=chunk_size or default_chunk_size())
+    )
+    for pk, author, group, text, pub_date, image in rows:
+        yield {
+            'type': 'post', 'id': pk, 'author': author, 'group': group,
+            'text': text, 'pub_date': pub_date.isoformat(),
+            'image': image or None,
+        }
+
+
+def comment_records(comments, chunk_size=None):
+    rows = (
+        comments.order_by('pk')
+        .values_list('pk', 'post_id', 'author__username', 'text', 'created')
+        .iterator(chunk_size=chunk_size or default_chunk_size())
+    )
+    for pk, post_id, author, text, created in rows:
+        yield {
+            'type': 'comment', 'id': pk, 'post': post_id, 'author': author,
+            'text': text, 'created': created.isoformat(),
+        }
+
+
+def user_records(user, chunk_size=None):
+    """Посты и комментарии одного пользователя."""
+    yield from post_records(Post.objects.filter(author=user), chunk_size)
+    yield from comment_records(
+        Comment.objects.filter(author=user), chunk_size)
+
+
+def site_records(chunk_size=None):
+    yield from post_records(Post.objects.all(), chunk_size)
+    yield from comment_records(Comment.objects.all(), chunk_size)
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer: отдаёт строку обратно."""
+
+    def write(self, value):
+        return value
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(records):
+    writer = csv.DictWriter(Echo(), CSV_COLUMNS, extrasaction='ignore')
+    yield writer.writerow(dict(zip(CSV_COLUMNS, CSV_COLUMNS)))
+    for record in records:
+        yield writer.writerow(record)
+
+
+def render(records, fmt):
+    """Итератор строк выгрузки в формате fmt из FORMATS."""
+    if fmt == 'csv':
+        return csv_lines(records)
+    return ndjson_lines(records)
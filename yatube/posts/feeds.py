@@ -0,0 +1,33 @@
+"""Querysets лент, общие для представлений и служебных команд."""
+from .models import Comment, Post
+from .timeline import FEED_KEYS, follow_feed
+
+FEED_RELATED = ('author', 'group')
+
+
+def index_feed():
+    return Post.objects.select_related(*FEED_RELATED)
+
+
+def group_feed(group):
+    return group.post_set.select_related(*FEED_RELATED)
+
+
+def author_feed(author):
+    return author.posts.select_related(*FEED_RELATED)
+
+
+# Ключи курсора ленты подписок, см. timeline.follow_feed
+SUBSCRIPTIONS_KEYS = FEED_KEYS
+
+
+def subscriptions_feed(user):
+    return follow_feed(user).select_related(*FEED_RELATED)
+
+
+# Комментарии листаются курсором по (created, id), новые сверху
+COMMENT_KEYS = ('created', 'id')
+
+
+def post_comments(post):
+    return Comment.objects.filter(post=post).select_related('author')
@@ -1,9 +1,33 @@
 from django import forms
+from django.template.defaultfilters import filesizeformat
 
+from . import images
 from .models import Post, Comment
 
 
 class PostForm(forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Оборванную загрузку не должен открывать ImageField
+        self.rejected_image = images.is_rejected(self.files.get('image'))
+        if self.rejected_image:
+            self.files = self.files.copy()
+            del self.files['image']
+
+    def clean_image(self):
+        if self.rejected_image:
+            limit = filesizeformat(images.max_upload_size())
+            raise forms.ValidationError(
+                f'Размер изображения не должен превышать {limit}.')
+        image = self.cleaned_data.get('image')
+        if 'image' not in self.changed_data:
+            return image
+        width = height = None
+        if image:
+            image, width, height = images.ingest(image)
+        self.instance.width, self.instance.height = width, height
+        return image
+
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
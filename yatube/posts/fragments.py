@@ -0,0 +1,69 @@
+"""Версии кэшированных фрагментов карточек постов.
+
+Ключ фрагмента содержит версию поста, которую сигналы увеличивают при
+сохранении Post, поэтому изменённая карточка просто получает новый ключ.
+Карточка сохраняется под версией, прочитанной до её данных, поэтому
+посты с реплики без готового фрагмента перечитываются с default:
+отставшая реплика сохранила бы старый текст под новым ключом.
+"""
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+
+from yatube.replicas import primary_reads, read_replica
+
+from . import versions
+from .feeds import FEED_RELATED
+from .models import Post
+
+FRAGMENT_NAME = 'post_card'
+
+
+def fragment_cache():
+    # Тот же кэш, что выбирает тег {% cache %}
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def card_scope(post_id):
+    return f'post_card:{post_id}'
+
+
+def bump_card_version(post_id):
+    versions.bump(card_scope(post_id))
+
+
+def attach_card_versions(posts):
+    """Проставляет post.card_version одним обращением к кэшу."""
+    scopes = {card_scope(post.pk): post for post in posts}
+    for scope, version in versions.get_versions(scopes).items():
+        scopes[scope].card_version = version
+    if read_replica():
+        refresh_uncached_cards(list(scopes.values()))
+    return posts
+
+
+def refresh_uncached_cards(posts):
+    """Перечитывает с default посты, чьих фрагментов ещё нет в кэше."""
+    keys = {
+        make_template_fragment_key(
+            FRAGMENT_NAME, [post.pk, post.card_version]): post
+        for post in posts}
+    cached = fragment_cache().get_many(list(keys))
+    missing = [post for key, post in keys.items() if key not in cached]
+    if not missing:
+        return
+    with primary_reads():
+        fresh = Post.objects.select_related(*FEED_RELATED).in_bulk(
+            [post.pk for post in missing])
+    for post in missing:
+        source = fresh.get(post.pk)
+        if source is None:
+            # Пост уже удалён: карточка рисуется без кэша
+            post.card_version = None
+            continue
+        for field in Post._meta.concrete_fields:
+            setattr(post, field.attname, getattr(source, field.attname))
+        for name in FEED_RELATED:
+            setattr(post, name, getattr(source, name))
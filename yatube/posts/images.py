@@ -0,0 +1,107 @@
+"""Приём изображений постов.
+
+Загрузка проходит через SizeLimitUploadHandler: данные сверх
+POST_IMAGE_MAX_SIZE не пишутся ни в память, ни во временный файл, а
+форма получает RejectedUpload и сообщает об ошибке. Принятое изображение
+перекодируется без метаданных (EXIF, GPS, профили), уменьшается до
+POST_IMAGE_MAX_SIDE по большей стороне и сохраняется в JPEG или, при
+наличии прозрачности, в PNG. Размеры записываются в Post.width/height.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image, ImageOps
+
+JPEG_OPTIONS = {'quality': 85, 'optimize': True, 'progressive': True}
+PNG_OPTIONS = {'optimize': True}
+
+
+def max_upload_size():
+    return getattr(settings, 'POST_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+
+
+def max_side():
+    return getattr(settings, 'POST_IMAGE_MAX_SIDE', 2560)
+
+
+def max_pixels():
+    return getattr(settings, 'POST_IMAGE_MAX_PIXELS', 50_000_000)
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, превысивший лимит: содержимого нет, только имя и размер."""
+
+    def __init__(self, name, content_type, size):
+        super().__init__(BytesIO(), name, content_type, size)
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """Первый обработчик цепочки: обрывает передачу слишком больших файлов.
+
+    Пока лимит не превышен, данные проходят дальше к стандартным
+    обработчикам, которые держат небольшие файлы в памяти, а большие
+    пишут на диск.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.rejected = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > max_upload_size():
+            self.rejected = True
+            return None
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.rejected:
+            return RejectedUpload(
+                self.file_name, self.content_type, self.received)
+        return None
+
+
+def is_rejected(upload):
+    return isinstance(upload, RejectedUpload)
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def ingest(upload):
+    """Перекодирует загрузку; возвращает (файл, ширина, высота)."""
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        width, height = image.size
+        if width * height > max_pixels():
+            raise ValidationError(
+                'Слишком большое разрешение изображения.', code='too_large')
+        if getattr(image, 'is_animated', False):
+            # Анимацию не перекодируем, чтобы не потерять кадры
+            upload.seek(0)
+            return upload, width, height
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side(), max_side()))
+        if has_alpha(image):
+            image = image.convert('RGBA')
+            image_format, extension, options = 'PNG', '.png', PNG_OPTIONS
+        else:
+            image = image.convert('RGB')
+            image_format, extension, options = 'JPEG', '.jpg', JPEG_OPTIONS
+        buffer = BytesIO()
+        image.save(buffer, image_format, **options)
+    except (OSError, Image.DecompressionBombError):
+        raise ValidationError(
+            'Не удалось обработать изображение.', code='invalid_image')
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return (ContentFile(buffer.getvalue(), name=stem + extension),
+            image.width, image.height)
@@ -0,0 +1,137 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT, '
+    'pub_date REAL, comment_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX post_pub_date ON post (pub_date DESC, id DESC)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER, '
+    'text TEXT, created REAL)',
+)
+FEED = 'SELECT id, text FROM post ORDER BY pub_date DESC, id DESC LIMIT 10'
+# Параметры Django по умолчанию: журнал DELETE, synchronous=FULL и
+# ожидание блокировки 5 секунд из модуля sqlite3
+BASELINE_PRAGMAS = {
+    'journal_mode': 'DELETE', 'busy_timeout': 5000, 'synchronous': 'FULL',
+}
+
+
+def seed(path, posts, pragmas):
+    db = sqlite3.connect(path)
+    # Режим журнала хранится в файле: его выставляет один процесс заранее
+    db.execute(f'PRAGMA journal_mode = {pragmas["journal_mode"]}')
+    for statement in SCHEMA:
+        db.execute(statement)
+    now = time.time()
+    db.executemany(
+        'INSERT INTO post (text, pub_date) VALUES (?, ?)',
+        ((f'Пост {i}', now - i) for i in range(posts)))
+    db.commit()
+    db.close()
+
+
+def comment(db, post_id):
+    """Транзакция add_comment: чтение поста, вставка, счётчик."""
+    db.execute('BEGIN')
+    try:
+        db.execute('SELECT id FROM post WHERE id = ?', (post_id,))
+        db.execute(
+            'INSERT INTO comment (post_id, text, created) VALUES (?, ?, ?)',
+            (post_id, 'комментарий', time.time()))
+        db.execute(
+            'UPDATE post SET comment_count = comment_count + 1 '
+            'WHERE id = ?', (post_id,))
+        db.execute('COMMIT')
+    except sqlite3.OperationalError:
+        db.execute('ROLLBACK')
+        raise
+
+
+def work(path, pragmas, retries, backoff, seconds, write_ratio, posts):
+    """Задача воркера: (записей, чтений, ошибок блокировки)."""
+    db = sqlite3.connect(path, isolation_level=None, timeout=0)
+    for name, value in pragmas.items():
+        if name != 'journal_mode':
+            db.execute(f'PRAGMA {name} = {value}')
+    writes = reads = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if random.random() >= write_ratio:
+            db.execute(FEED).fetchall()
+            reads += 1
+            continue
+        for attempt in range(retries + 1):
+            try:
+                comment(db, random.randint(1, posts))
+                writes += 1
+                break
+            except sqlite3.OperationalError:
+                if attempt == retries:
+                    errors += 1
+                    break
+                time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+    db.close()
+    return writes, reads, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite под конкурентной '
+        'нагрузкой воркеров: параметры по умолчанию против SQLITE_PRAGMAS '
+        'с повтором транзакций, как в retry_on_lock. Работает на '
+        'временной базе и не трогает данные проекта.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--write-ratio', type=float, default=0.2,
+            help='Доля транзакций add_comment среди операций.')
+        parser.add_argument('--posts', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        profiles = (
+            ('default', BASELINE_PRAGMAS, 0),
+            ('production', settings.SQLITE_PRAGMAS,
+             settings.DATABASE_LOCK_RETRIES),
+        )
+        results = {}
+        for name, pragmas, retries in profiles:
+            results[name] = self.run(pragmas, retries, options)
+            writes, reads, errors = results[name]
+            self.stdout.write(
+                f'{name}: записей/с {writes / options["seconds"]:.0f}, '
+                f'чтений/с {reads / options["seconds"]:.0f}, '
+                f'ошибок блокировки {errors}')
+        before = sum(results['default'][:2])
+        after = sum(results['production'][:2])
+        if before:
+            self.stdout.write(self.style.SUCCESS(
+                f'Прирост пропускной способности: x{after / before:.1f}'))
+
+    def run(self, pragmas, retries, options):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'bench.sqlite3')
+        try:
+            seed(path, options['posts'], pragmas)
+            args = (
+                path, pragmas, retries, settings.DATABASE_LOCK_BACKOFF,
+                options['seconds'], options['write_ratio'],
+                options['posts'])
+            with ProcessPoolExecutor(options['workers']) as pool:
+                futures = [
+                    pool.submit(work, *args)
+                    for _ in range(options['workers'])]
+                totals = [future.result() for future in futures]
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        return tuple(map(sum, zip(*totals)))
@@ -0,0 +1,157 @@
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+from posts import feeds
+from posts.models import Comment, Follow, Group, Post, TimelineEntry, User
+from posts.pagination import CURSOR_KEYS, CursorPaginator
+
+BATCH_SIZE = 5000
+TEMPORARY_ALIAS = 'explain_feeds'
+
+
+def is_problem(line):
+    """Полный проход по таблице или сортировка во временном B-дереве."""
+    if 'TEMP B-TREE' in line or 'Seq Scan' in line:
+        return True
+    return 'SCAN' in line and 'USING' not in line
+
+
+@contextmanager
+def temporary_database():
+    """Подменяет default пустой базой с применёнными миграциями.
+
+    База создаётся так же, как тестовая, и удаляется на выходе, поэтому
+    заполнение не блокирует рабочую базу и ничего в ней не оставляет.
+    """
+    connections.databases[TEMPORARY_ALIAS] = {
+        **connections.databases[DEFAULT_DB_ALIAS], 'TEST': {}}
+    temporary = connections[TEMPORARY_ALIAS]
+    old_name = temporary.settings_dict['NAME']
+    primary = connections[DEFAULT_DB_ALIAS]
+    # Подмена до миграций: RunPython пишет через default
+    connections[DEFAULT_DB_ALIAS] = temporary
+    try:
+        temporary.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            temporary.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        connections[DEFAULT_DB_ALIAS] = primary
+        del connections[TEMPORARY_ALIAS]
+        del connections.databases[TEMPORARY_ALIAS]
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет временную базу синтетическими данными и выводит план '
+        'выполнения каждого запроса лент из posts/views.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            with transaction.atomic():
+                self.seed(options)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            problems = self.explain_all()
+        if problems:
+            self.stdout.write(self.style.ERROR(
+                f'Запросов с полным сканированием или сортировкой: '
+                f'{problems}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Все запросы лент идут по индексам'))
+
+    def seed(self, options):
+        self.stdout.write('Заполнение базы...')
+        # bulk_create на SQLite не возвращает pk, поэтому перечитываем
+        User.objects.bulk_create(
+            [User(username=f'explain_user_{i}')
+             for i in range(options['users'])],
+            batch_size=BATCH_SIZE)
+        users = list(User.objects.filter(username__startswith='explain_user_'))
+        Group.objects.bulk_create(
+            [Group(title=f'Группа {i}', slug=f'explain-group-{i}',
+                   description='')
+             for i in range(options['groups'])])
+        groups = list(Group.objects.filter(slug__startswith='explain-group-'))
+        self.bulk(Post, (
+            Post(text=f'Пост {i}', author=random.choice(users),
+                 group=random.choice(groups + [None]))
+            for i in range(options['posts'])))
+        post_ids = list(Post.objects.values_list('pk', flat=True))
+        self.bulk(Comment, (
+            Comment(post_id=random.choice(post_ids),
+                    author=random.choice(users), text='Комментарий')
+            for _ in range(options['comments'])))
+        self.reader = users[0]
+        followed = random.sample(users[1:], min(50, len(users) - 1))
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=author) for author in followed])
+        self.bulk(TimelineEntry, (
+            TimelineEntry(user=self.reader, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in Post.objects.filter(
+                author__in=followed).values_list('pk', 'pub_date')))
+        self.group = groups[0]
+        self.author = followed[0]
+        self.post = Post.objects.filter(author=self.author).first()
+
+    def bulk(self, model, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+    def querysets(self):
+        per_page = settings.PER_PAGE_COUNT
+        feeds_by_name = {
+            'index': feeds.index_feed(),
+            'group_posts': feeds.group_feed(self.group),
+            'profile': feeds.author_feed(self.author),
+            'follow_index': feeds.subscriptions_feed(self.reader),
+        }
+        for name, queryset in feeds_by_name.items():
+            keys = (feeds.SUBSCRIPTIONS_KEYS if name == 'follow_index'
+                    else CURSOR_KEYS)
+            yield f'{name} (page)', queryset[per_page:per_page * 2]
+            paginator = CursorPaginator(queryset, per_page, keys)
+            yield f'{name} (cursor)', paginator.keyset(
+                self.post.pub_date, self.post.pk)[:per_page + 1]
+        # Комментарии листаются так же, как в views.comments_page
+        comments = CursorPaginator(
+            feeds.post_comments(self.post), settings.COMMENTS_PER_PAGE,
+            feeds.COMMENT_KEYS)
+        yield 'post_view (comments)', feeds.post_comments(self.post).order_by(
+            *(f'-{key}' for key in feeds.COMMENT_KEYS)
+        )[:settings.COMMENTS_PER_PAGE + 1]
+        # Позиция курсора на план не влияет
+        yield 'post_comments (cursor)', comments.keyset(
+            self.post.pub_date, self.post.pk)[:settings.COMMENTS_PER_PAGE + 1]
+        yield 'profile (following)', self.author.following.filter(
+            user=self.reader)
+
+    def explain_all(self):
+        problems = 0
+        for name, queryset in self.querysets():
+            plan = queryset.explain()
+            flagged = any(is_problem(line) for line in plan.splitlines())
+            problems += flagged
+            style = self.style.WARNING if flagged else self.style.SUCCESS
+            self.stdout.write(style(f'== {name}'))
+            self.stdout.write(plan)
+        return problems
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import export
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты и комментарии всего сайта или одного '
+        'пользователя в NDJSON или CSV. Формат совместим с import_posts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', default=None,
+            help='Выгрузить только посты и комментарии этого пользователя.')
+        parser.add_argument(
+            '--format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл выгрузки или «-» для стандартного вывода.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=None,
+            help='Строк на одно чтение из базы.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'Нет пользователя {options["user"]}')
+            records = export.user_records(user, chunk_size)
+        else:
+            records = export.site_records(chunk_size)
+        if options['output'] == '-':
+            self.write(records, options['format'], self.stdout)
+        else:
+            with open(options['output'], 'w', encoding='utf-8',
+                      newline='') as target:
+                self.write(records, options['format'], target)
+
+    def write(self, records, fmt, target):
+        for line in export.render(records, fmt):
+            target.write(line)
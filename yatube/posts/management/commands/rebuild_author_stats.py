@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import rebuild_author_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает AuthorStats по таблицам Follow и Post.'
+
+    def handle(self, *args, **options):
+        total = rebuild_author_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано авторов: {total}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import comment_count_drift, rebuild_comment_counts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает Post.comment_count по таблице Comment.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать расхождения, ничего не менять.')
+
+    def handle(self, *args, **options):
+        drift = comment_count_drift().values_list(
+            'pk', 'comment_count', 'actual')
+        drifted = 0
+        for pk, stored, actual in drift.iterator():
+            drifted += 1
+            self.stdout.write(f'post {pk}: {stored} -> {actual}')
+        self.stdout.write(f'Расхождений: {drifted}')
+        if drifted and not options['dry_run']:
+            rebuild_comment_counts()
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
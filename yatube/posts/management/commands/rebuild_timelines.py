@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Раскладывает заново ленты подписок по таблицам Follow и Post. '
+        'Авторы с pull_timeline берутся из AuthorStats, поэтому после '
+        'загрузки мимо сигналов сначала запустите rebuild_author_stats.'
+    )
+
+    def handle(self, *args, **options):
+        total = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {total}'))
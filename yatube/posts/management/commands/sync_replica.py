@@ -0,0 +1,37 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует базу SQLite default в файл реплики онлайн-бэкапом. '
+        'Заменяет репликацию при локальной проверке REPLICA_DATABASE.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=None,
+            help='Алиас реплики, по умолчанию REPLICA_DATABASE или '
+                 '«replica».')
+
+    def handle(self, *args, **options):
+        alias = (options['database']
+                 or getattr(settings, 'REPLICA_DATABASE', None) or 'replica')
+        if alias not in connections.databases:
+            raise CommandError(f'Нет базы {alias} в DATABASES')
+        primary = connections[DEFAULT_DB_ALIAS]
+        replica = connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Команда копирует только базы SQLite')
+        primary.ensure_connection()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
+        replica.close()
+        self.stdout.write(self.style.SUCCESS(
+            f'{alias} <- {DEFAULT_DB_ALIAS}'))
@@ -0,0 +1,124 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails, versions
+from posts.conditional import SITE_SCOPE
+from posts.fragments import card_scope
+from posts.models import Post
+
+
+def warm(image_name, force):
+    """Задача воркера: (имя, текст ошибки или None)."""
+    try:
+        thumbnails.generate(image_name, force=force)
+    except Exception as error:
+        return image_name, f'{type(error).__name__}: {error}'
+    finally:
+        connections.close_all()
+    return image_name, None
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры карточек для всех Post.image пачками в пуле '
+        'процессов. Прогресс сохраняется в --checkpoint, повторный запуск '
+        'продолжает с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Число процессов, по умолчанию по числу ядер; '
+                 '0 — без пула.')
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Не больше стольких изображений в секунду; 0 — без '
+                 'ограничения.')
+        parser.add_argument(
+            '--checkpoint', default=None,
+            help='Файл с pk последнего обработанного поста.')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать миниатюры, даже если хранилище их знает.')
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint'] and Path(options['checkpoint'])
+        last_pk = self.read_checkpoint(checkpoint)
+        posts = (
+            Post.objects.exclude(image='').exclude(image=None)
+            .filter(pk__gt=last_pk).order_by('pk')
+        )
+        total = posts.count()
+        if last_pk:
+            self.stdout.write(f'Продолжение после поста {last_pk}')
+        workers = options['workers']
+        if workers == 0 or thumbnails.in_memory_db():
+            pool = None
+        else:
+            # Дочерние процессы не должны наследовать открытые соединения
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=workers)
+        self.started = time.monotonic()
+        done = failed = 0
+        try:
+            for chunk in self.chunks(posts, options['chunk_size']):
+                names = [name for _, name in chunk]
+                force = [options['force']] * len(names)
+                if pool is None:
+                    results = map(warm, names, force)
+                else:
+                    results = pool.map(warm, names, force)
+                for name, error in results:
+                    if error:
+                        failed += 1
+                        self.stderr.write(f'{name}: {error}')
+                versions.bump(*(card_scope(pk) for pk, _ in chunk))
+                done += len(chunk)
+                self.write_checkpoint(checkpoint, chunk[-1][0])
+                self.report(done, total, failed)
+                self.throttle(done, options['rate'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        versions.bump(SITE_SCOPE)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, ошибок: {failed}'))
+
+    def chunks(self, posts, size):
+        # Пачки по pk, а не OFFSET: каждая выборка идёт по первичному ключу
+        last_pk = 0
+        while True:
+            chunk = list(
+                posts.filter(pk__gt=last_pk).values_list('pk', 'image')[:size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1][0]
+
+    def report(self, done, total, failed):
+        elapsed = time.monotonic() - self.started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{done}/{total} изображений, {rate:.1f} в секунду, '
+            f'ошибок: {failed}')
+
+    def throttle(self, done, rate):
+        if not rate:
+            return
+        ahead = done / rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def read_checkpoint(self, path):
+        if not path or not path.exists():
+            return 0
+        return int(path.read_text().strip() or 0)
+
+    def write_checkpoint(self, path, pk):
+        if path:
+            path.write_text(str(pk))
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_for(model, field):
+    # order_by() убирает Meta.ordering из GROUP BY, как в counters
+    counts = (
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def fill_author_stats(apps, schema_editor):
+    # Строки всех существующих пользователей, чтобы первое чтение профиля
+    # не считало агрегаты; новых пользователей добавляет сигнал
+    User = apps.get_model('auth', 'User')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    users = User.objects.annotate(
+        actual_followers=count_for(Follow, 'author'),
+        actual_following=count_for(Follow, 'user'),
+        actual_posts=count_for(Post, 'author'),
+    ).values_list(
+        'pk', 'actual_followers', 'actual_following', 'actual_posts')
+    batch = []
+    for pk, followers, following, posts in users.iterator(chunk_size=1000):
+        batch.append(AuthorStats(
+            user_id=pk, followers_count=followers,
+            following_count=following, posts_count=posts))
+        if len(batch) >= 1000:
+            AuthorStats.objects.bulk_create(batch)
+            batch = []
+    AuthorStats.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0013_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_author_stats, migrations.RunPython.noop),
+    ]
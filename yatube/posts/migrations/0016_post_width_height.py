@@ -0,0 +1,38 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:23
+
+from django.core.files.images import get_image_dimensions
+from django.db import migrations, models
+
+
+def fill_dimensions(apps, schema_editor):
+    # Читается только заголовок файла; отсутствующие файлы пропускаются
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.exclude(image='').exclude(image=None)
+    for post in posts.iterator(chunk_size=1000):
+        try:
+            width, height = get_image_dimensions(post.image)
+        except (OSError, ValueError):
+            continue
+        if width and height:
+            Post.objects.filter(pk=post.pk).update(width=width, height=height)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='height',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='width',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(fill_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_refcounts(apps, schema_editor):
+    # Старые файлы сохраняют свои имена, но тоже получают счётчик ссылок.
+    # order_by() сбрасывает Meta.ordering: иначе pub_date попадёт в GROUP BY
+    # и общий файл нескольких постов даст несколько строк с одним именем
+    Post = apps.get_model('posts', 'Post')
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    counts = (
+        Post.objects.exclude(image='').exclude(image=None)
+        .order_by().values('image').annotate(total=Count('id'))
+        .values_list('image', 'total')
+    )
+    MediaFile.objects.bulk_create(
+        [MediaFile(name=name, refcount=total) for name, total in counts],
+        batch_size=1000)
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_width_height'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/'),
+        ),
+        migrations.RunPython(fill_refcounts, migrations.RunPython.noop),
+    ]
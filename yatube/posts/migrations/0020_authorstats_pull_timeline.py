@@ -0,0 +1,28 @@
+# Generated by Django 2.2.6 on 2026-10-18 02:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pull_authors(apps, schema_editor):
+    # Раньше режим решался по текущему числу подписчиков
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    limit = getattr(settings, 'TIMELINE_FANOUT_LIMIT', 10000)
+    AuthorStats.objects.filter(followers_count__gt=limit).update(
+        pull_timeline=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_comment_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='pull_timeline',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_pull_authors, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.db import models
 
+from .storage import post_image_storage
+
 
 User = get_user_model()
 
@@ -19,10 +21,27 @@ class Post(models.Model):
         null=True,
         on_delete=models.SET_NULL,
     )
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(
+        upload_to='posts/', storage=post_image_storage,
+        blank=True, null=True)
+    # Заполняются при приёме загрузки, см. posts/images.py
+    width = models.PositiveIntegerField(null=True, editable=False)
+    height = models.PositiveIntegerField(null=True, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_id'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_id'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_id'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -56,6 +75,14 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_id'),
+            models.Index(
+                fields=['-created', '-id'],
+                name='comment_created_id'),
+        ]
 
 
 class Follow(models.Model):
@@ -71,7 +98,7 @@ class Follow(models.Model):
     )
 
     def __str__(self):
-        return self.author
+        return f'{self.user} -> {self.author}'
 
     class Meta:
         constraints = [
@@ -79,3 +106,66 @@ class Follow(models.Model):
                 fields=['user', 'author'],
                 name="unique_followers")
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user'),
+        ]
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    posts_count = models.PositiveIntegerField(default=0)
+    # Посты автора читаются лентами напрямую, см. posts/timeline.py.
+    # Флаг не снимается при отписках: посты, вышедшие в этом режиме,
+    # не разложены по TimelineEntry
+    pull_timeline = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user_id}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.user_id}:{self.post_id}'
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_post')
+        ]
+
+
+class MediaFile(models.Model):
+    """Число постов, ссылающихся на файл в ContentAddressedStorage."""
+    name = models.CharField(max_length=255, unique=True)
+    refcount = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
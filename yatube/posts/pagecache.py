@@ -0,0 +1,79 @@
+"""Кэш готовых ответов для гостей.
+
+Ключ — путь с параметрами и версии областей страницы из conditional,
+поэтому запись в Post, Comment или Follow «сбрасывает» ровно те
+страницы, чьи области увеличили сигналы: индекс, группу поста и профиль
+автора. Старые ответы просто перестают читаться и истекают сами.
+
+Промах собирает страницу с default, а не с реплики: отставшие данные
+закрепились бы в кэше под уже новыми версиями. В кэш не попадают
+ответы, которые ставят cookie или содержат CSRF-токен.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from yatube.replicas import primary_reads
+
+from .conditional import page_versions
+
+RESPONSE_KEY = 'page_response:{}'
+
+
+def response_key(request, scope_templates, kwargs):
+    raw = '|'.join(
+        [request.get_full_path()]
+        + page_versions(request, scope_templates, kwargs))
+    return RESPONSE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def freeze(response):
+    # Локальный уровень кэша отдаёт один и тот же объект, поэтому
+    # хранятся только байты и заголовки, а ответ собирается заново
+    return response.content, list(response.items())
+
+
+def thaw(frozen):
+    content, headers = frozen
+    response = HttpResponse(content)
+    for name, value in headers:
+        response[name] = value
+    return response
+
+
+def is_cacheable(request, response):
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+    )
+
+
+def anonymous_cache(*scope_templates):
+    """Декоратор: отдаёт гостям сохранённый ответ страницы.
+
+    Время жизни записи задаёт ANONYMOUS_PAGE_CACHE_TIMEOUT, 0 отключает
+    кэш.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            timeout = getattr(settings, 'ANONYMOUS_PAGE_CACHE_TIMEOUT', 0)
+            if (not timeout or request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            key = response_key(request, scope_templates, kwargs)
+            frozen = cache.get(key)
+            if frozen is not None:
+                return thaw(frozen)
+            with primary_reads():
+                response = view(request, *args, **kwargs)
+            if is_cacheable(request, response):
+                cache.set(key, freeze(response), timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,278 @@
+import base64
+import binascii
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, router
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+CURSOR_KEYS = ('pub_date', 'id')
+COUNT_KEY = 'feed_count:{}'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(post, keys=CURSOR_KEYS):
+    """Непрозрачный токен позиции в ленте по паре (дата, id)."""
+    date_key, id_key = keys
+    raw = f'{getattr(post, date_key).isoformat()}|{getattr(post, id_key)}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        raise InvalidCursor(token)
+    if pub_date is None:
+        raise InvalidCursor(token)
+    return pub_date, pk
+
+
+class CursorPage(Sequence):
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous,
+                 keys=CURSOR_KEYS):
+        self.object_list = object_list
+        self.keys = keys
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], self.keys)
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], self.keys)
+        return None
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (дата, id) без COUNT и OFFSET.
+
+    Стоимость любой страницы одинакова: индексный диапазон плюс LIMIT.
+    keys — поля или аннотации, по которым упорядочена лента; по
+    умолчанию (pub_date, id) поста.
+    """
+
+    def __init__(self, object_list, per_page, keys=CURSOR_KEYS):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.keys = keys
+
+    def get_page(self, after=None, before=None):
+        try:
+            if before:
+                return self._page_before(decode_cursor(before))
+            if after:
+                return self._page_after(decode_cursor(after))
+        except InvalidCursor:
+            pass
+        return self._page_after(None)
+
+    def _ordered(self, descending=True):
+        sign = '-' if descending else ''
+        return self.object_list.order_by(*(sign + key for key in self.keys))
+
+    def keyset(self, pub_date, pk):
+        """Записи ленты строго после позиции (pub_date, pk)."""
+        date_key, id_key = self.keys
+        # Отдельное условие date <= pub_date даёт планировщику диапазон
+        # по индексу (дата, id), которого не видно внутри OR
+        return self._ordered().filter(
+            Q(**{f'{date_key}__lte': pub_date}),
+            Q(**{f'{date_key}__lt': pub_date}) | Q(**{f'{id_key}__lt': pk}))
+
+    def _page_after(self, position):
+        if position is None:
+            queryset = self._ordered()
+        else:
+            queryset = self.keyset(*position)
+        items = list(queryset[:self.per_page + 1])
+        has_next = len(items) > self.per_page
+        return CursorPage(
+            items[:self.per_page], has_next, position is not None,
+            self.keys)
+
+    def _page_before(self, position):
+        pub_date, pk = position
+        date_key, id_key = self.keys
+        queryset = self._ordered(descending=False).filter(
+            Q(**{f'{date_key}__gte': pub_date}),
+            Q(**{f'{date_key}__gt': pub_date}) | Q(**{f'{id_key}__gt': pk}))
+        items = list(queryset[:self.per_page + 1])
+        has_previous = len(items) > self.per_page
+        items = items[:self.per_page]
+        items.reverse()
+        return CursorPage(items, True, has_previous, self.keys)
+
+
+def estimated_count(model):
+    """Оценка числа строк таблицы по статистике СУБД или None."""
+    table = model._meta.db_table
+    connection = connections[router.db_for_read(model)]
+    queries = {
+        'postgresql': (
+            'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'),
+        'sqlite': 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+        'mysql': (
+            'SELECT table_rows FROM information_schema.tables '
+            'WHERE table_name = %s'),
+    }
+    sql = queries.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    return int(str(row[0]).split()[0])
+
+
+def feed_count_key(scope):
+    return COUNT_KEY.format(scope)
+
+
+def feed_count_keys(post):
+    """Ключи счётчиков всех лент, в которые попадает пост."""
+    keys = [feed_count_key('index'),
+            feed_count_key(f'author:{post.author_id}')]
+    if post.group_id:
+        keys.append(feed_count_key(f'group:{post.group_id}'))
+    return keys
+
+
+def change_feed_counts(keys, delta):
+    """Сдвигает закэшированные счётчики, отсутствующие посчитаются сами."""
+    for key in keys:
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, берущий count из кэша, который поддерживают сигналы.
+
+    При промахе для больших неотфильтрованных таблиц (estimate=True)
+    используется оценка СУБД, иначе выполняется COUNT и результат
+    кэшируется на FEED_COUNT_TIMEOUT секунд.
+    """
+
+    def __init__(self, object_list, per_page, scope, estimate=False,
+                 **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = feed_count_key(scope)
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.count_key)
+        if count is not None:
+            return count
+        count = None
+        if self.estimate:
+            count = estimated_count(self.object_list.model)
+            threshold = getattr(
+                settings, 'FEED_COUNT_ESTIMATE_THRESHOLD', 100000)
+            if count is not None and count < threshold:
+                count = None
+        if count is None:
+            count = super().count
+        cache.set(
+            self.count_key, count,
+            getattr(settings, 'FEED_COUNT_TIMEOUT', 600))
+        return count
+
+    def page(self, number):
+        # Срез не обрезается по count: устаревший счётчик влияет только
+        # на ссылки паджинатора, но не на содержимое страницы
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class BoundedCountPaginator(Paginator):
+    """Paginator для списков админки на больших таблицах.
+
+    Без фильтров count берётся из статистики СУБД, с фильтрами считается
+    не дальше ADMIN_COUNT_LIMIT строк: COUNT по подзапросу с LIMIT.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model)
+            threshold = getattr(
+                settings, 'FEED_COUNT_ESTIMATE_THRESHOLD', 100000)
+            if estimate is not None and estimate >= threshold:
+                return estimate
+        limit = getattr(settings, 'ADMIN_COUNT_LIMIT', 10000)
+        return queryset[:limit].count()
+
+
+def cursor_requested(request):
+    if getattr(settings, 'FEED_PAGINATION', 'offset') == 'cursor':
+        return True
+    return 'after' in request.GET or 'before' in request.GET
+
+
+def get_page(request, object_list, scope, estimate=False,
+             cursor_keys=CURSOR_KEYS):
+    """Страница ленты в режиме offset (по умолчанию) или cursor.
+
+    scope — имя закэшированного счётчика ленты, например 'group:3'.
+    None — счётчик не кэшируется: так для лент, которые меняются без
+    сигнала об их ключе, например ленты подписок.
+    """
+    if cursor_requested(request):
+        paginator = CursorPaginator(
+            object_list, settings.PER_PAGE_COUNT, cursor_keys)
+        return paginator.get_page(
+            after=request.GET.get('after'), before=request.GET.get('before'))
+    if scope is None:
+        paginator = Paginator(object_list, settings.PER_PAGE_COUNT)
+    else:
+        paginator = CachedCountPaginator(
+            object_list, settings.PER_PAGE_COUNT, scope, estimate=estimate)
+    return paginator.get_page(request.GET.get('page'))
@@ -0,0 +1,199 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой POST_SEARCH_BACKEND. SQLiteFTSBackend держит
+обратный индекс в виртуальной таблице FTS5 и ранжирует совпадения по
+bm25; LikeSearchBackend — запасной вариант без индекса для других СУБД.
+Индекс обновляют сигналы Post, полностью его пересобирает команда
+rebuild_search_index.
+"""
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from . import feeds
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+BATCH_SIZE = 1000
+
+
+class RawSubquery(RawSQL):
+    """Подзапрос для pk__in без лишних скобок.
+
+    RawSQL оборачивает SQL в скобки, In добавляет свои, и SQLite читает
+    IN ((SELECT ...)) как скалярный подзапрос с одной строкой.
+    """
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+def read_connection():
+    """Соединение для чтения индекса, его выбирает роутер баз."""
+    return connections[router.db_for_read(Post)]
+
+
+def terms(query):
+    return re.findall(r'\w+', query.lower())
+
+
+class SearchResults:
+    """Ленивая выборка для Paginator: count() и срезы в порядке ранга."""
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.terms = terms(query)
+
+    @cached_property
+    def _count(self):
+        if not self.terms:
+            return 0
+        return self.backend.count(self.terms)
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start = item.start or 0
+        stop = self._count if item.stop is None else item.stop
+        if not self.terms or stop <= start:
+            return []
+        ids = self.backend.ranked_ids(self.terms, start, stop - start)
+        posts = Post.objects.select_related(*feeds.FEED_RELATED).in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class SearchBackend(ABC):
+    """Индекс по умолчанию не нужен; поиск реализуют наследники."""
+
+    def index(self, posts):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    @abstractmethod
+    def count(self, terms):
+        """Число постов, содержащих все слова."""
+
+    @abstractmethod
+    def ranked_ids(self, terms, offset, limit):
+        """Id совпадений в порядке ранга, срез [offset:offset + limit]."""
+
+    @abstractmethod
+    def ranked_subquery(self, terms, limit):
+        """Первые limit совпадений для pk__in без списка параметров.
+
+        Список id длиннее 999 SQLite до 3.32 не принимает.
+        """
+
+    def search(self, query):
+        return SearchResults(self, query)
+
+
+class LikeSearchBackend(SearchBackend):
+    """Поиск без индекса: все слова через icontains, новые выше."""
+
+    def matching(self, terms):
+        posts = Post.objects.all()
+        for term in terms:
+            posts = posts.filter(text__icontains=term)
+        return posts
+
+    def count(self, terms):
+        return self.matching(terms).count()
+
+    def ranked_ids(self, terms, offset, limit):
+        ids = self.matching(terms).order_by('-pub_date', '-id')
+        return list(ids.values_list('id', flat=True)[offset:offset + limit])
+
+    def ranked_subquery(self, terms, limit):
+        ids = self.matching(terms).order_by('-pub_date', '-id')
+        return ids.values('id')[:limit]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """Обратный индекс FTS5, rowid строки индекса — id поста.
+
+    Каждое слово запроса ищется по префиксу, совпадения упорядочены по
+    bm25, при равном ранге — более новые посты.
+    """
+
+    def match(self, terms):
+        return ' '.join('"{}"*'.format(term) for term in terms)
+
+    def index(self, posts):
+        rows = [(post.pk, post.text) for post in posts]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE}(rowid, text) VALUES (%s, %s)', rows)
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in post_ids])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        posts = Post.objects.only('id', 'text').order_by('pk')
+        batch = []
+        for post in posts.iterator(chunk_size=BATCH_SIZE):
+            batch.append(post)
+            if len(batch) >= BATCH_SIZE:
+                self.index(batch)
+                batch = []
+        self.index(batch)
+
+    def count(self, terms):
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s', [self.match(terms)])
+            return cursor.fetchone()[0]
+
+    def ranked_ids(self, terms, offset, limit):
+        with read_connection().cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                [self.match(terms), limit, offset])
+            return [row[0] for row in cursor.fetchall()]
+
+    def ranked_subquery(self, terms, limit):
+        return RawSubquery(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+            f'ORDER BY rank, rowid DESC LIMIT %s',
+            [self.match(terms), limit])
+
+
+@lru_cache(maxsize=None)
+def load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    return load_backend(getattr(
+        settings, 'POST_SEARCH_BACKEND', 'posts.search.LikeSearchBackend'))
+
+
+def search_posts(query):
+    return get_backend().search(query)
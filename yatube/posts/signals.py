@@ -0,0 +1,164 @@
+"""Обработчики, поддерживающие производные данные постов.
+
+Счётчики в базе меняются в той же транзакции, что и запись. Кэш с
+транзакцией не откатывается, поэтому счётчики лент и версии страниц
+меняются только после фиксации (after_commit): retry_on_lock повторил
+бы немедленное изменение на каждой попытке, а версия, увеличенная до
+фиксации, дала бы параллельному GET сохранить под ней старые данные.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, search, timeline, versions
+from .conditional import (AUTHOR_SCOPE, INDEX_SCOPE, POST_SCOPE,
+                          SITE_SCOPE, post_pages)
+from .fragments import bump_card_version
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+from .pagination import change_feed_counts, feed_count_key, feed_count_keys
+
+
+def after_commit(func, *args):
+    """Вызывает func после фиксации; аргументы вычислены заранее."""
+    transaction.on_commit(lambda: func(*args))
+
+
+@receiver(post_save, sender=User)
+def create_author_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author_stats(instance.author_id, posts_count=1)
+        after_commit(change_feed_counts, feed_count_keys(instance), 1)
+        timeline.fan_out(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние группу и изображение для post_save."""
+    if instance.pk is None or raw:
+        return
+    previous = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list('group_id', 'group__slug', 'image').first()
+    )
+    if previous is None:
+        return
+    old_group_id, old_group_slug, old_image = previous
+    if (old_image or '') != (instance.image.name or ''):
+        instance._old_image = old_image
+    if old_group_id == instance.group_id:
+        return
+    instance._old_group_slug = old_group_slug
+    if old_group_id:
+        after_commit(
+            change_feed_counts, [feed_count_key(f'group:{old_group_id}')], -1)
+    if instance.group_id:
+        after_commit(
+            change_feed_counts,
+            [feed_count_key(f'group:{instance.group_id}')], 1)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if not created and not hasattr(instance, '_old_image'):
+        return
+    if instance.image:
+        counters.acquire_image(instance.image.name)
+    old_image = instance.__dict__.pop('_old_image', None)
+    if old_image:
+        counters.release_image(old_image)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_card(sender, instance, created, **kwargs):
+    if not created:
+        after_commit(bump_card_version, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_posts_count(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, posts_count=-1)
+    after_commit(change_feed_counts, feed_count_keys(instance), -1)
+    if instance.image:
+        counters.release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_author_stats(instance.author_id, followers_count=1)
+        counters.change_author_stats(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def trim_timeline(sender, instance, **kwargs):
+    counters.change_author_stats(instance.author_id, followers_count=-1)
+    counters.change_author_stats(instance.user_id, following_count=-1)
+    timeline.trim(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.change_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    counters.change_comment_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        after_commit(versions.bump, *post_pages(instance))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        post = instance.post
+        after_commit(
+            versions.bump,
+            INDEX_SCOPE,
+            AUTHOR_SCOPE.format(username=post.author.username),
+            POST_SCOPE.format(post_id=post.pk),
+        )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        after_commit(
+            versions.bump,
+            AUTHOR_SCOPE.format(username=instance.author.username),
+            AUTHOR_SCOPE.format(username=instance.user.username),
+        )
+
+
+@receiver(post_save, sender=Group)
+def bump_site_pages(sender, raw=False, **kwargs):
+    if not raw:
+        after_commit(versions.bump, SITE_SCOPE)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove([instance.pk])
@@ -0,0 +1,80 @@
+"""Хранилище изображений постов с адресацией по содержимому.
+
+Файл называется по SHA-256 своих байтов, поэтому одинаковые загрузки
+указывают на один файл и один набор миниатюр. Сколько постов ссылается на
+файл, хранит MediaFile.refcount (см. counters); файл и его миниатюры
+удаляются, только когда ссылок не осталось.
+"""
+import hashlib
+import logging
+import os
+import uuid
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import delete as delete_thumbnails
+from sorl.thumbnail.images import ImageFile
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, сохраняющий posts/ab/cd/<sha256>.<расширение>."""
+
+    def content_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(
+            directory, digest[:2], digest[2:4], digest + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            # Такие байты уже лежат на диске, второй копии не нужно
+            return name
+        # Файл пишется под временным именем и появляется под своим одной
+        # жёсткой ссылкой: читатели не видят недописанный файл, а из двух
+        # параллельных загрузок одних байтов вторая получает
+        # FileExistsError и просто отбрасывает свою копию
+        temp_name = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        temp_path = self.path(temp_name)
+        try:
+            os.link(temp_path, self.path(name))
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+        return name
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяет содержимое, а временные имена уникальны, поэтому
+        # суффиксы против коллизий не нужны
+        return name
+
+
+post_image_storage = ContentAddressedStorage()
+
+
+def delete_with_thumbnails(name):
+    """Удаляет файл и все миниатюры, которые sorl создал из него.
+
+    Очистка не должна ломать запрос, поэтому ошибки только логируются.
+    """
+    try:
+        delete_thumbnails(ImageFile(name, post_image_storage))
+    except (OSError, SuspiciousFileOperation):
+        logger.exception('Не удалось удалить файл %s', name)
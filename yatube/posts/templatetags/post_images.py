@@ -0,0 +1,19 @@
+from django import template
+
+from ..thumbnails import largest_with_srcset, ready_ladder, requeue
+
+register = template.Library()
+
+
+@register.simple_tag
+def card_thumbnail(post):
+    """Миниатюра карточки с im.srcset, если фоновый поток её создал.
+
+    Ленты заранее проставляют post.card_thumbnails через
+    attach_thumbnails, иначе ступени ищутся по одной.
+    """
+    if hasattr(post, 'card_thumbnails'):
+        return largest_with_srcset(post.card_thumbnails)
+    ladder = ready_ladder(post.image)
+    requeue(post, ladder)
+    return largest_with_srcset(ladder)
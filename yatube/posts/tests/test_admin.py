@@ -0,0 +1,159 @@
+import sqlite3
+from itertools import count
+from unittest import mock
+
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import admin
+from ..models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class ScalableAdminTest(TestCase):
+    numbers = count()
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.create_rows(2)
+
+    @classmethod
+    def create_rows(cls, rows):
+        for _ in range(rows):
+            i = next(cls.numbers)
+            author = User.objects.create_user(username=f'Автор {i}')
+            post = Post.objects.create(text=f'Текст {i}', author=author)
+            Comment.objects.create(post=post, author=cls.author, text='Привет')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+        cache.clear()
+
+    def changelist_queries(self, model, **params):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_rows_do_not_add_queries(self):
+        """Число запросов списка не зависит от числа строк."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                before = len(self.changelist_queries(model))
+                self.create_rows(5)
+                Follow.objects.create(
+                    user=self.author, author=User.objects.last())
+                self.assertEqual(len(self.changelist_queries(model)), before)
+
+    @override_settings(FEED_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_unfiltered_list_uses_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        sql = self.changelist_queries('post')
+        self.assertFalse(
+            [query for query in sql if 'COUNT(' in query.upper()])
+
+    @override_settings(ADMIN_COUNT_LIMIT=3)
+    def test_filtered_count_is_bounded(self):
+        self.create_rows(5)
+        sql = self.changelist_queries('comment', q=self.author.username)
+        counts = [query for query in sql if 'COUNT(' in query.upper()]
+        self.assertTrue(counts)
+        self.assertTrue(all('LIMIT 3' in query for query in counts))
+
+    def test_follow_search_by_username(self):
+        url = reverse('admin:posts_follow_changelist')
+        response = self.client.get(url, {'q': self.reader.username})
+        self.assertEqual(
+            [str(follow) for follow in response.context['cl'].result_list],
+            [f'{self.reader} -> {self.author}'])
+
+    def test_delete_asks_for_confirmation(self):
+        url = reverse('admin:posts_post_changelist')
+        ids = list(Post.objects.values_list('pk', flat=True))
+        response = self.client.post(url, {
+            'action': 'delete_selected',
+            '_selected_action': ids,
+        })
+        self.assertTemplateUsed(
+            response, 'admin/delete_selected_confirmation.html')
+        self.assertEqual(Post.objects.count(), len(ids))
+
+    def test_delete_in_chunks(self):
+        """После подтверждения удаление идёт пачками и пишется в журнал."""
+        self.create_rows(3)
+        url = reverse('admin:posts_post_changelist')
+        ids = list(Post.objects.values_list('pk', flat=True))
+        with mock.patch.object(admin, 'BULK_CHUNK_SIZE', 2):
+            response = self.client.post(url, {
+                'action': 'delete_selected',
+                '_selected_action': ids,
+                'post': 'yes',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(
+            sorted(int(pk) for pk in LogEntry.objects.filter(
+                action_flag=DELETION).values_list('object_id', flat=True)),
+            sorted(ids))
+
+    def test_delete_chunks_fit_sqlite_variable_limit(self):
+        """Пачка в тысячу строк укладывается в 999 параметров SQLite."""
+        author = User.objects.get(username='Автор')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author) for i in range(1100))
+        AuthorStats.objects.filter(user=author).update(
+            posts_count=Post.objects.filter(author=author).count())
+        raw = connection.connection
+        previous = raw.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+        self.addCleanup(
+            raw.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, previous)
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'), {
+                'action': 'delete_selected',
+                '_selected_action': [Post.objects.first().pk],
+                'select_across': '1',
+                'post': 'yes',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Post.objects.exists())
+
+    def test_delete_needs_permission_for_cascades(self):
+        """Без права на удаление комментариев посты с ними не удаляются."""
+        editor = User.objects.create_user('editor', is_staff=True)
+        editor.user_permissions.add(*Permission.objects.filter(
+            codename__in=('view_post', 'delete_post')))
+        self.client.force_login(editor)
+        ids = list(Post.objects.values_list('pk', flat=True))
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'), {
+                'action': 'delete_selected',
+                '_selected_action': ids,
+                'post': 'yes',
+            })
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Post.objects.count(), len(ids))
+
+    def test_default_delete_action_is_replaced(self):
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        actions = dict(response.context['action_form'].fields[
+            'action'].choices)
+        self.assertEqual(
+            actions['delete_selected'],
+            admin.delete_in_chunks.short_description)
@@ -0,0 +1,90 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(PER_PAGE_COUNT=2)
+class FeedApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(5)
+        ]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, name, kwargs=None, **params):
+        response = self.client.get(reverse(name, kwargs=kwargs), params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.templates, [])
+        return response
+
+    def test_feeds_return_posts(self):
+        """JSON-ленты отдают те же посты, что и HTML-страницы."""
+        self.client.force_login(self.reader)
+        urls = {
+            'api_index': None,
+            'api_group_posts': {'slug': self.group.slug},
+            'api_profile': {'username': self.author.username},
+            'api_follow_index': None,
+        }
+        for name, kwargs in urls.items():
+            with self.subTest(name=name):
+                data = self.get(name, kwargs).json()
+                self.assertEqual(
+                    [post['id'] for post in data['results']],
+                    [self.posts[4].pk, self.posts[3].pk])
+                first = data['results'][0]
+                self.assertEqual(first['author'], 'Автор')
+                self.assertEqual(first['group'], 'group')
+                self.assertEqual(first['thumbnails'], {})
+                self.assertEqual(first['url'], reverse(
+                    'post', args=('Автор', self.posts[4].pk)))
+
+    def test_cursor_walks_whole_feed(self):
+        seen = []
+        params = {}
+        while True:
+            data = self.get('api_index', **params).json()
+            seen += [post['id'] for post in data['results']]
+            if not data['next']:
+                break
+            params = {'after': data['next']}
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+
+        data = self.get('api_index', before=params['after']).json()
+        self.assertEqual(
+            [post['id'] for post in data['results']],
+            [self.posts[3].pk, self.posts[2].pk])
+
+    def test_sparse_fields(self):
+        """fields= оставляет в ответе только перечисленные поля."""
+        data = self.get('api_index', fields='id,text', limit=1).json()
+        self.assertEqual(
+            data['results'], [{'id': self.posts[4].pk, 'text': 'Пост 4'}])
+
+    def test_bad_parameters(self):
+        response = self.get('api_index', fields='id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+        response = self.get('api_index', limit='много')
+        self.assertEqual(response.status_code, 400)
+
+    def test_follow_requires_login(self):
+        response = self.get('api_follow_index')
+        self.assertEqual(response.status_code, 401)
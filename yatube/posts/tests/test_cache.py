@@ -0,0 +1,109 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from yatube.cache import SQLiteCache, TwoTierCache
+
+
+def worker():
+    return TwoTierCache('shared', {'OPTIONS': {'SYNC_INTERVAL': 0}})
+
+
+class TwoTierCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_second_read_hits_local_tier(self):
+        """Повторное чтение обслуживает локальный уровень."""
+        first = worker()
+        first.set('key', 'значение')
+        second = worker()
+        self.assertEqual(second.get('key'), 'значение')
+        self.assertEqual(second.get('key'), 'значение')
+        self.assertEqual(second.stats(), {
+            'local': {'hits': 1, 'misses': 1},
+            'shared': {'hits': 1, 'misses': 0},
+        })
+
+    def test_delete_reaches_other_workers(self):
+        """Удаление в одном воркере сбрасывает локальный уровень других."""
+        first, second = worker(), worker()
+        first.set('key', 'значение')
+        self.assertEqual(second.get('key'), 'значение')
+        first.delete('key')
+        self.assertIsNone(second.get('key'))
+
+    def test_version_counters_are_always_shared(self):
+        """Счётчики версий читаются из общего уровня."""
+        first, second = worker(), worker()
+        first.set('version', 1)
+        self.assertEqual(second.get('version'), 1)
+        first.incr('version')
+        self.assertEqual(second.get('version'), 2)
+
+
+def shared_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def increment(path, times):
+    store = shared_cache(path)
+    for _ in range(times):
+        store.incr('counter')
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'shared.sqlite3')
+        self.store = shared_cache(self.path)
+
+    def test_incr_is_atomic_across_processes(self):
+        """Параллельные процессы не теряют увеличений счётчика."""
+        self.store.set('counter', 0, None)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.path, 200))
+            for _ in range(4)]
+        for process in workers:
+            process.start()
+        for process in workers:
+            process.join()
+        self.assertEqual(self.store.get('counter'), 800)
+
+    def test_incr_keeps_timeout(self):
+        self.store.set('forever', 1, None)
+        self.store.set('short', 1, 0.2)
+        self.store.incr('forever')
+        self.store.incr('short', 5)
+        self.assertEqual(self.store.get('short'), 6)
+        time.sleep(0.3)
+        self.assertEqual(self.store.get('forever'), 2)
+        self.assertIsNone(self.store.get('short'))
+        with self.assertRaises(ValueError):
+            self.store.incr('short')
+
+    def test_values_and_add(self):
+        self.store.set_many({'list': [1, 'два'], 'flag': True})
+        self.assertEqual(
+            self.store.get_many(['list', 'flag', 'missing']),
+            {'list': [1, 'два'], 'flag': True})
+        self.assertFalse(self.store.add('list', 'другое'))
+        self.store.set('expired', 1, -1)
+        self.assertTrue(self.store.add('expired', 'новое'))
+        self.assertEqual(self.store.get('expired'), 'новое')
+
+    def test_cull_keeps_unexpiring_keys(self):
+        store = shared_cache(self.path, MAX_ENTRIES=10, CULL_EVERY=1)
+        store.set('version', 1, None)
+        for i in range(20):
+            store.set(f'key{i}', i, 60)
+        self.assertEqual(store.get('version'), 1)
+        self.assertLessEqual(
+            len(store.get_many([f'key{i}' for i in range(20)])), 10)
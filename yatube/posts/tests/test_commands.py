@@ -0,0 +1,234 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .. import thumbnails
+from ..management.commands.import_posts import Command
+from ..models import (AuthorStats, Comment, Follow, MediaFile, Post,
+                      TimelineEntry)
+from ..search import search_posts
+from .test_thumbnails import uploaded_png
+
+User = get_user_model()
+
+
+class RebuildCommentCountsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        Comment.objects.create(
+            post=cls.post, author=cls.user, text='комментарий')
+
+    def test_reports_and_fixes_drift(self):
+        """Команда находит расхождение счётчика и исправляет его."""
+        Post.objects.filter(pk=self.post.pk).update(comment_count=5)
+        out = StringIO()
+        call_command('rebuild_comment_counts', '--dry-run', stdout=out)
+        self.assertIn(f'post {self.post.pk}: 5 -> 1', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 5)
+
+        call_command('rebuild_comment_counts', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+
+class RebuildAuthorStatsTest(TestCase):
+    def test_rebuilds_from_source_tables(self):
+        """Команда восстанавливает AuthorStats из Follow и Post."""
+        author = User.objects.create_user(username='Автор')
+        reader = User.objects.create_user(username='Читатель')
+        Post.objects.create(text='Тестовый текст', author=author)
+        Follow.objects.create(user=reader, author=author)
+
+        call_command('rebuild_author_stats', stdout=StringIO())
+        stats = AuthorStats.objects.get(user=author)
+        self.assertEqual(
+            (stats.followers_count, stats.following_count,
+             stats.posts_count),
+            (1, 0, 1))
+        self.assertEqual(
+            AuthorStats.objects.get(user=reader).following_count, 1)
+
+
+class RebuildTimelinesTest(TestCase):
+    def test_rebuilds_from_follows(self):
+        """Команда восстанавливает ленты по Follow и Post."""
+        author = User.objects.create_user(username='Автор')
+        reader = User.objects.create_user(username='Читатель')
+        post = Post.objects.create(text='Тестовый текст', author=author)
+        Follow.objects.create(user=reader, author=author)
+        TimelineEntry.objects.all().delete()
+
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(reader.pk, post.pk)])
+
+
+class ExplainFeedsTest(TestCase):
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент не сканируют таблицы и не сортируют во временных."""
+        out = StringIO()
+        # Заполняется временная база, рабочая не затрагивается
+        with self.assertNumQueries(0):
+            call_command(
+                'explain_feeds', '--posts', '2000', '--users', '50',
+                '--comments', '500', stdout=out)
+        self.assertIn('Все запросы лент идут по индексам', out.getvalue())
+        self.assertIn('post_comments (cursor)', out.getvalue())
+        self.assertFalse(User.objects.filter(
+            username__startswith='explain_user_').exists())
+
+
+class WarmThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+        user = User.objects.create_user(username='Хаски')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=user,
+                image=uploaded_png(f'small{i}.png', (i, 0, 0)))
+            for i in range(3)
+        ]
+        cls.broken = Post.objects.create(
+            text='Без файла', author=user, image='posts/missing.gif')
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.checkpoint = os.path.join(self.media_root, 'checkpoint')
+        self.addCleanup(
+            lambda: os.path.exists(self.checkpoint)
+            and os.remove(self.checkpoint))
+
+    def warm(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'warm_thumbnails', '--workers', '0', '--chunk-size', '2',
+            '--checkpoint', self.checkpoint, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_generates_ladders_and_resumes(self):
+        """Команда создаёт миниатюры, сообщает об ошибках и продолжает."""
+        out, err = self.warm()
+        for post in self.posts:
+            self.assertEqual(
+                sorted(thumbnails.ready_ladder(post.image)),
+                list(thumbnails.CARD_WIDTHS))
+        self.assertIn('posts/missing.gif', err)
+        self.assertIn('4/4 изображений', out)
+        self.assertIn('Готово: 4, ошибок: 1', out)
+        with open(self.checkpoint) as checkpoint:
+            self.assertEqual(checkpoint.read(), str(self.broken.pk))
+
+        out, _ = self.warm()
+        self.assertIn(f'Продолжение после поста {self.broken.pk}', out)
+        self.assertIn('Готово: 0, ошибок: 0', out)
+
+    def test_rate_limit_sleeps(self):
+        with mock.patch('time.sleep') as sleep:
+            self.warm('--rate', '1')
+        self.assertTrue(sleep.called)
+
+
+class ImportPostsTest(TestCase):
+    records = [
+        {'type': 'user', 'username': 'автор'},
+        {'type': 'user', 'username': 'читатель'},
+        {'type': 'group', 'slug': 'cats', 'title': 'Кошки'},
+        {'type': 'post', 'id': 'p1', 'author': 'автор', 'group': 'cats',
+         'text': 'Перенесённый пост про кошек',
+         'pub_date': '2015-03-01T10:00:00+00:00',
+         'image': 'posts/imported.jpg'},
+        {'type': 'post', 'id': 'p2', 'author': 'автор',
+         'text': 'Второй пост'},
+        {'type': 'comment', 'post': 'p1', 'author': 'читатель',
+         'text': 'Комментарий', 'created': '2015-03-02T10:00:00'},
+        {'type': 'follow', 'user': 'читатель', 'author': 'автор'},
+        {'type': 'follow', 'user': 'читатель', 'author': 'автор'},
+        {'type': 'post', 'author': 'никто', 'text': 'Потерянный'},
+        {'type': 'comment', 'post': 'p9', 'author': 'автор', 'text': '?'},
+    ]
+
+    def setUp(self):
+        cache.clear()
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(handle, 'w', encoding='utf-8') as source:
+            for record in self.records:
+                source.write(json.dumps(record, ensure_ascii=False) + '\n')
+            source.write('не json\n')
+        self.addCleanup(os.remove, self.path)
+
+    def test_imports_and_rebuilds_derived_data(self):
+        """Импорт сохраняет даты и пересобирает производные данные."""
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_posts', self.path, '--chunk-size', '2',
+            stdout=out, stderr=err)
+        self.assertIn('Пропущено записей: 3', out.getvalue())
+        self.assertIn('follow: 1', out.getvalue())
+        self.assertIn('строка 9', err.getvalue())
+
+        author = User.objects.get(username='автор')
+        reader = User.objects.get(username='читатель')
+        post = Post.objects.get(text__startswith='Перенесённый')
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.comments.get().created.year, 2015)
+        self.assertEqual(Follow.objects.count(), 1)
+        stats = AuthorStats.objects.get(user=author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count), (2, 1))
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 2)
+        self.assertEqual(
+            MediaFile.objects.get(name='posts/imported.jpg').refcount, 1)
+        self.assertEqual(list(search_posts('кошек')), [post])
+
+    def test_new_rows_get_fresh_pks(self):
+        """После импорта обычное создание не конфликтует по pk."""
+        call_command('import_posts', self.path, stdout=StringIO(),
+                     stderr=StringIO())
+        author = User.objects.get(username='автор')
+        post = Post.objects.create(text='После импорта', author=author)
+        self.assertGreater(post.pk, Post.objects.exclude(pk=post.pk)
+                           .order_by('-pk').first().pk)
+
+    def test_pks_survive_concurrent_inserts(self):
+        """Строки, созданные сайтом между пачками, не занимают pk импорта."""
+        flush = Command.flush
+        author = User.objects.create_user(username='живой автор')
+
+        def flush_after_live_insert(command):
+            Post.objects.create(text='Живой пост', author=author)
+            flush(command)
+
+        with mock.patch.object(Command, 'flush', flush_after_live_insert):
+            call_command(
+                'import_posts', self.path, '--chunk-size', '2',
+                stdout=StringIO(), stderr=StringIO())
+        self.assertTrue(Post.objects.filter(text='Второй пост').exists())
+        post = Post.objects.get(text__startswith='Перенесённый')
+        self.assertEqual(post.comments.get().text, 'Комментарий')
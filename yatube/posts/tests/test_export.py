@@ -0,0 +1,72 @@
+import csv
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.posts = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author)
+            for i in range(3)
+        ]
+        Post.objects.create(text='Чужой пост', author=cls.reader)
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Свой, "с кавычками"')
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Чужой')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+        self.url = reverse('export_posts', kwargs={'username': 'Автор'})
+
+    def test_streams_own_records_as_ndjson(self):
+        """Выгрузка потоковая и содержит только записи пользователя."""
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertIn('attachment', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [(record['type'], record['text']) for record in records],
+            [('post', 'Пост 0'), ('post', 'Пост 1'), ('post', 'Пост 2'),
+             ('comment', 'Свой, "с кавычками"')])
+
+    def test_csv_format(self):
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1]['text'], 'Свой, "с кавычками"')
+        self.assertEqual(rows[-1]['post'], str(self.posts[0].pk))
+
+    def test_other_users_cannot_export(self):
+        self.client.force_login(self.reader)
+        response = self.client.get(self.url)
+        self.assertRedirects(
+            response, reverse('profile', kwargs={'username': 'Автор'}))
+
+    def test_command_dumps_site_in_small_chunks(self):
+        """Команда выгружает весь сайт, формат читает import_posts."""
+        out = StringIO()
+        call_command('export_posts', '--chunk-size', '1', stdout=out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['post'] * 4 + ['comment'] * 2)
+        self.assertEqual(records[-1]['post'], self.posts[0].pk)
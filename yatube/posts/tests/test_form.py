@@ -1,11 +1,15 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase
+from django.template.defaultfilters import filesizeformat
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
 from ..models import Group, Post
 
 User = get_user_model()
@@ -72,13 +76,10 @@ class PostCreateFormTests(TestCase):
 
         self.assertRedirects(response, reverse('index'))
         self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text='Тестовый текст',
-                group=self.group.id,
-                image='posts/small.gif'
-            ).exists()
-        )
+        post = Post.objects.get(text='Тестовый текст', group=self.group.id,
+                                image__startswith='posts/')
+        self.assertRegex(post.image.name, r'^posts/\w\w/\w\w/\w{64}\.jpg$')
+        self.assertEqual((post.width, post.height), (2, 1))
 
     def test_edit_post(self):
         """Форма редактирует запись в Post."""
@@ -104,3 +105,65 @@ class PostCreateFormTests(TestCase):
                 group=self.group.id,
             ).exists()
         )
+
+
+def image_file(name, size, mode='RGB', image_format='PNG', **options):
+    buffer = BytesIO()
+    Image.new(mode, size).save(buffer, image_format, **options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.user = User.objects.create_user(username='Хаски')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def create(self, upload):
+        return self.client.post(
+            reverse('new'), {'text': 'С картинкой', 'image': upload})
+
+    def test_reencodes_and_strips_metadata(self):
+        """Загрузка перекодируется в JPEG без EXIF и уменьшается."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Камера'
+        upload = image_file(
+            'photo.jpg', (3000, 1500), image_format='JPEG',
+            exif=exif.tobytes())
+        with self.settings(POST_IMAGE_MAX_SIDE=1200):
+            self.create(upload)
+        post = Post.objects.get(text='С картинкой')
+        self.assertEqual((post.width, post.height), (1200, 600))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (1200, 600))
+            self.assertNotIn('exif', stored.info)
+
+    def test_transparent_image_stays_png(self):
+        self.create(image_file('logo.png', (40, 20), mode='RGBA'))
+        post = Post.objects.get(text='С картинкой')
+        self.assertTrue(post.image.name.endswith('.png'))
+        self.assertEqual((post.width, post.height), (40, 20))
+
+    def test_oversized_upload_is_rejected(self):
+        """Файл сверх лимита не принимается и не сохраняется."""
+        upload = image_file('big.png', (200, 200))
+        with self.settings(POST_IMAGE_MAX_SIZE=100):
+            response = self.create(upload)
+        self.assertFalse(Post.objects.filter(text='С картинкой').exists())
+        self.assertFormError(
+            response, 'form', 'image',
+            f'Размер изображения не должен превышать {filesizeformat(100)}.')
@@ -0,0 +1,126 @@
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Откатывает схему до migrate_from и проверяет данные после migrate_to.
+
+    Данные создаются историческими моделями в setUpBeforeMigration.
+    """
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.leaf = executor.loader.graph.leaf_nodes('posts')
+        executor.migrate([('posts', self.migrate_from)])
+        executor.loader.build_graph()
+        old_apps = executor.loader.project_state(
+            ('posts', self.migrate_from)).apps
+        self.setUpBeforeMigration(old_apps)
+        executor.migrate([('posts', self.migrate_to)])
+        executor.loader.build_graph()
+        self.apps = executor.loader.project_state(
+            ('posts', self.migrate_to)).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.leaf)
+        super().tearDown()
+
+    def setUpBeforeMigration(self, apps):
+        pass
+
+
+class TimelineMigrationTest(MigrationTestCase):
+    migrate_from = '0011_auto_20210612_1336'
+    migrate_to = '0012_timelineentry'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        Follow = apps.get_model('posts', 'Follow')
+        author = User.objects.create(username='Автор')
+        self.reader = User.objects.create(username='Читатель')
+        stranger = User.objects.create(username='Другой')
+        self.posts = {
+            Post.objects.create(text=f'Пост {i}', author=author).pk
+            for i in range(3)}
+        Post.objects.create(text='Чужой пост', author=stranger)
+        Follow.objects.create(user=self.reader, author=author)
+
+    def test_fills_timelines_of_existing_follows(self):
+        """Подписчик сразу видит посты авторов, на которых уже подписан."""
+        TimelineEntry = self.apps.get_model('posts', 'TimelineEntry')
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('user_id', 'post_id')),
+            {(self.reader.pk, pk) for pk in self.posts})
+
+
+class CommentCountMigrationTest(MigrationTestCase):
+    migrate_from = '0012_timelineentry'
+    migrate_to = '0013_post_comment_count'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        Comment = apps.get_model('posts', 'Comment')
+        user = User.objects.create(username='Автор')
+        self.commented = Post.objects.create(text='Пост', author=user)
+        self.silent = Post.objects.create(text='Без комментариев', author=user)
+        for i in range(5):
+            Comment.objects.create(
+                post=self.commented, author=user, text=f'Комментарий {i}')
+
+    def test_backfills_full_counts(self):
+        """Каждый пост получает полное число своих комментариев."""
+        Post = self.apps.get_model('posts', 'Post')
+        self.assertEqual(
+            Post.objects.get(pk=self.commented.pk).comment_count, 5)
+        self.assertEqual(Post.objects.get(pk=self.silent.pk).comment_count, 0)
+
+
+class AuthorStatsMigrationTest(MigrationTestCase):
+    migrate_from = '0013_post_comment_count'
+    migrate_to = '0014_authorstats'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        Follow = apps.get_model('posts', 'Follow')
+        self.author = User.objects.create(username='Автор')
+        self.reader = User.objects.create(username='Читатель')
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_fills_stats_for_existing_users(self):
+        AuthorStats = self.apps.get_model('posts', 'AuthorStats')
+        self.assertEqual(
+            set(AuthorStats.objects.values_list(
+                'user_id', 'followers_count', 'following_count',
+                'posts_count')),
+            {(self.author.pk, 1, 0, 3), (self.reader.pk, 0, 1, 0)})
+
+
+class ImageRefcountMigrationTest(MigrationTestCase):
+    migrate_from = '0016_post_width_height'
+    migrate_to = '0017_content_addressed_images'
+
+    def setUpBeforeMigration(self, apps):
+        User = apps.get_model('auth', 'User')
+        Post = apps.get_model('posts', 'Post')
+        user = User.objects.create(username='Автор')
+        for i in range(2):
+            Post.objects.create(
+                text=f'Пост {i}', author=user, image='posts/a.jpg')
+        Post.objects.create(text='Другой', author=user, image='posts/b.jpg')
+        Post.objects.create(text='Без картинки', author=user)
+
+    def test_shared_image_gets_one_row(self):
+        """Общая картинка постов получает одну строку со всеми ссылками."""
+        MediaFile = self.apps.get_model('posts', 'MediaFile')
+        self.assertEqual(
+            dict(MediaFile.objects.values_list('name', 'refcount')),
+            {'posts/a.jpg': 2, 'posts/b.jpg': 1})
@@ -0,0 +1,131 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from .. import urls
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FEED_VIEWS = (
+    'index', 'group_posts', 'profile', 'post', 'follow_index',
+    'api_index', 'api_group_posts', 'api_profile', 'api_follow_index',
+)
+
+
+class QueryBudgetTest(TestCase):
+    """Число запросов представлений не зависит от размера страницы."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.group = Group.objects.create(
+            title='Новая группа',
+            description='Описание',
+            slug='new_group'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = cls.create_posts(1)[0]
+
+    @classmethod
+    def create_posts(cls, count):
+        posts = []
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=cls.author,
+                group=cls.group,
+            )
+            for commented in (post, getattr(cls, 'post', post)):
+                Comment.objects.create(
+                    post=commented, author=cls.reader, text='комментарий')
+            posts.append(post)
+        return posts
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+        cache.clear()
+
+    def urls(self):
+        author = self.author.username
+        post = {'username': author, 'post_id': self.post.id}
+        return {
+            'index': reverse('index'),
+            'new': reverse('new'),
+            'group_posts': reverse(
+                'group_posts', kwargs={'slug': self.group.slug}),
+            'post': reverse('post', kwargs=post),
+            'edit': reverse('edit', kwargs=post),
+            'add_comment': reverse('add_comment', kwargs=post),
+            'follow_index': reverse('follow_index'),
+            'profile_follow': reverse(
+                'profile_follow', kwargs={'username': author}),
+            'profile_unfollow': reverse(
+                'profile_unfollow', kwargs={'username': author}),
+            'profile': reverse('profile', kwargs={'username': author}),
+            'search': reverse('search') + '?q=Тестовый',
+            'api_index': reverse('api_index'),
+            'api_group_posts': reverse(
+                'api_group_posts', kwargs={'slug': self.group.slug}),
+            'api_profile': reverse(
+                'api_profile', kwargs={'username': author}),
+            'api_follow_index': reverse('api_follow_index'),
+            'export_posts': reverse(
+                'export_posts', kwargs={'username': author}),
+        }
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_every_view_declares_budget(self):
+        """Каждое представление posts.urls объявляет бюджет запросов."""
+        for pattern in urls.urlpatterns:
+            with self.subTest(name=pattern.name):
+                self.assertIsInstance(
+                    getattr(pattern.callback, 'query_budget', None), int)
+
+    def test_views_stay_within_budget(self):
+        """Все представления укладываются в объявленный бюджет."""
+        self.client.force_login(self.reader)
+        self.create_posts(settings.PER_PAGE_COUNT)
+        for name, url in self.urls().items():
+            with self.subTest(name=name):
+                budget = resolve(url.split('?')[0]).func.query_budget
+                self.assertLessEqual(self.count_queries(url), budget)
+
+    def test_writes_stay_within_budget(self):
+        """POST-запросы укладываются в объявленный бюджет."""
+        urls = self.urls()
+        forms = {
+            'new': {'text': 'Новый пост', 'group': self.group.id},
+            'edit': {'text': 'Новый текст'},
+            'add_comment': {'text': 'комментарий'},
+        }
+        for name, data in forms.items():
+            with self.subTest(name=name):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.post(urls[name], data)
+                budget = resolve(urls[name]).func.query_budget
+                self.assertLessEqual(len(queries), budget)
+
+    def test_feed_queries_do_not_grow_with_page(self):
+        """Число запросов ленты одинаково для одной и полной страницы."""
+        self.client.force_login(self.reader)
+        urls = {name: self.urls()[name] for name in FEED_VIEWS}
+        for url in urls.values():
+            self.count_queries(url)
+        single = {name: self.count_queries(url) for name, url in urls.items()}
+        self.create_posts(settings.PER_PAGE_COUNT)
+        for name, url in urls.items():
+            with self.subTest(name=name):
+                self.assertEqual(self.count_queries(url), single[name])
@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from yatube.replicas import REPLICA_PIN_COOKIE, ReplicaRouter
+
+from ..models import Post
+
+User = get_user_model()
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTest(TransactionTestCase):
+    """В тестах replica — зеркало default, поэтому данные видны сразу.
+
+    TransactionTestCase нужен, чтобы чтение не попадало в открытую
+    транзакцию default, которую роутер закрепляет за основной базой.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Автор')
+        Post.objects.create(text='Тестовый текст', author=self.user)
+        self.client = Client()
+
+    def queries(self, method, url, data=None):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url, data)
+        return response, len(primary), len(replica)
+
+    def test_feed_reads_go_to_replica(self):
+        self.client.force_login(self.user)
+        # Первый запрос перечитывает карточки с default, см. ниже
+        self.client.get(reverse('index'))
+        response, primary, replica = self.queries('get', reverse('index'))
+        self.assertContains(response, 'Тестовый текст')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+        self.assertNotIn(REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_writer_reads_own_writes_from_primary(self):
+        """После записи браузер читает с default, пока действует cookie."""
+        self.client.force_login(self.user)
+        response, _, replica = self.queries(
+            'post', reverse('new'), {'text': 'Свежий пост'})
+        self.assertEqual(replica, 0)
+        self.assertIn(REPLICA_PIN_COOKIE, response.cookies)
+
+        response, primary, replica = self.queries('get', reverse('index'))
+        self.assertContains(response, 'Свежий пост')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        del self.client.cookies[REPLICA_PIN_COOKIE]
+        _, _, replica = self.queries('get', reverse('index'))
+        self.assertGreater(replica, 0)
+
+    def test_anonymous_miss_renders_from_primary(self):
+        """Страница для кэша гостей собирается с default и получает ETag."""
+        response, primary, replica = self.queries('get', reverse('index'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+        self.assertTrue(response.has_header('ETag'))
+
+        response, primary, replica = self.queries('get', reverse('index'))
+        self.assertEqual((primary, replica), (0, 0))
+        self.assertTrue(response.has_header('ETag'))
+
+    def test_uncached_cards_are_read_from_primary(self):
+        """Карточка без фрагмента перечитывается с default и кэшируется."""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connections['default']) as primary:
+            response = self.client.get(reverse('index'))
+        self.assertFalse(response.has_header('ETag'))
+        self.assertTrue([query for query in primary
+                         if 'posts_post' in query['sql']])
+
+        # Версия не менялась, поэтому карточка берётся из кэша
+        Post.objects.update(text='Новый текст')
+        with CaptureQueriesContext(connections['default']) as primary:
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, 'Тестовый текст')
+        self.assertFalse([query for query in primary
+                          if 'posts_post' in query['sql']])
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_disabled_without_setting(self):
+        _, primary, replica = self.queries('get', reverse('index'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_replica_is_not_migrated(self):
+        router = ReplicaRouter()
+        self.assertIs(router.allow_migrate('replica', 'posts'), False)
+        self.assertIsNone(router.allow_migrate('default', 'posts'))
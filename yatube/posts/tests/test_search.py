@@ -0,0 +1,115 @@
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+from ..search import FTS_TABLE, SearchBackend, search_posts
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        cls.rare = Post.objects.create(
+            text='Кот спит на диване', author=cls.user)
+        cls.frequent = Post.objects.create(
+            text='Коты, коты и ещё раз коты', author=cls.user)
+        Post.objects.create(text='Собака гуляет', author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def found(self, query):
+        return [post.pk for post in search_posts(query)[:10]]
+
+    def test_ranked_prefix_search(self):
+        """Слова ищутся по префиксу без учёта регистра, частые выше."""
+        self.assertEqual(self.found('КОТ'), [self.frequent.pk, self.rare.pk])
+        self.assertEqual(self.found('кот диван'), [self.rare.pk])
+        self.assertEqual(self.found('"; DROP'), [])
+        self.assertEqual(self.found(''), [])
+
+    def test_index_follows_writes(self):
+        rare = Post.objects.get(pk=self.rare.pk)
+        rare.text = 'Попугай спит'
+        rare.save()
+        self.assertEqual(self.found('кот'), [self.frequent.pk])
+        self.assertEqual(self.found('попугай'), [self.rare.pk])
+        Post.objects.get(pk=self.frequent.pk).delete()
+        self.assertEqual(self.found('кот'), [])
+
+    def test_view_paginates_results(self):
+        for i in range(settings.PER_PAGE_COUNT):
+            Post.objects.create(text=f'Кот номер {i}', author=self.user)
+        response = self.client.get(reverse('search'), {'q': 'кот'})
+        page = response.context['page']
+        self.assertEqual(page.paginator.count, settings.PER_PAGE_COUNT + 2)
+        self.assertEqual(len(page), settings.PER_PAGE_COUNT)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;page=2')
+        response = self.client.get(
+            reverse('search'), {'q': 'кот', 'page': 2})
+        self.assertEqual(len(response.context['page']), 2)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке не сканирует Post через LIKE."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), {'q': 'кот'})
+        self.assertEqual(
+            {post.pk for post in response.context['cl'].result_list},
+            {self.rare.pk, self.frequent.pk})
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn(FTS_TABLE, sql)
+        self.assertNotIn('LIKE', sql)
+
+    @override_settings(SEARCH_ADMIN_LIMIT=1)
+    def test_admin_search_filters_by_subquery(self):
+        """Совпадения приходят подзапросом, число параметров не растёт."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        for backend in ('posts.search.SQLiteFTSBackend',
+                        'posts.search.LikeSearchBackend'):
+            with self.subTest(backend=backend), \
+                    override_settings(POST_SEARCH_BACKEND=backend), \
+                    CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse('admin:posts_post_changelist'), {'q': 'кот'})
+                self.assertEqual(
+                    len(response.context['cl'].result_list), 1)
+                self.assertFalse([
+                    query for query in queries
+                    if f'IN ({self.frequent.pk}' in query['sql']])
+
+    @override_settings(POST_SEARCH_BACKEND='posts.search.LikeSearchBackend')
+    def test_like_backend(self):
+        self.assertEqual(self.found('спит диван'), [self.rare.pk])
+
+    def test_backend_must_implement_search(self):
+        class CountOnly(SearchBackend):
+            def count(self, terms):
+                return 0
+
+        with self.assertRaises(TypeError):
+            CountOnly()
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        self.assertEqual(self.found('кот'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.found('кот'), [self.frequent.pk, self.rare.pk])
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase)
+
+from .. import versions
+from ..conditional import INDEX_SCOPE
+from ..decorators import retry_on_lock
+from ..models import Post
+from ..pagination import feed_count_key
+
+
+class SqlitePragmasTest(TestCase):
+    def pragma(self, db, name):
+        with db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        """Новое соединение к файлу базы получает WAL и остальные PRAGMA."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        db = DatabaseWrapper(
+            dict(connection.settings_dict,
+                 NAME=os.path.join(directory, 'db.sqlite3')),
+            alias='pragma_check')
+        self.addCleanup(db.close)
+        self.assertEqual(self.pragma(db, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(db, 'synchronous'), 1)
+        self.assertEqual(
+            self.pragma(db, 'busy_timeout'),
+            settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(
+            self.pragma(db, 'mmap_size'),
+            settings.SQLITE_PRAGMAS['mmap_size'])
+
+    def test_in_memory_database_keeps_journal(self):
+        self.assertEqual(
+            self.pragma(connection, 'busy_timeout'),
+            settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(self.pragma(connection, 'journal_mode'), 'memory')
+
+
+class RetryOnLockTest(TransactionTestCase):
+    def setUp(self):
+        self.request = RequestFactory().post('/')
+        self.calls = 0
+        sleep = mock.patch('time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def view(self, *errors):
+        errors = list(errors)
+
+        @retry_on_lock
+        def view(request):
+            self.calls += 1
+            if errors:
+                raise errors.pop(0)
+            return HttpResponse('ok')
+        return view
+
+    def test_retries_locked_transaction(self):
+        locked = OperationalError('database is locked')
+        response = self.view(locked, locked)(self.request)
+        self.assertEqual(response.content, b'ok')
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(self.sleep.call_count, 2)
+
+    def test_gives_up_after_retries(self):
+        locked = OperationalError('database is locked')
+        view = self.view(*[locked] * (settings.DATABASE_LOCK_RETRIES + 1))
+        with self.assertRaises(OperationalError):
+            view(self.request)
+        self.assertEqual(self.calls, settings.DATABASE_LOCK_RETRIES + 1)
+
+    def test_other_errors_are_not_retried(self):
+        with self.assertRaises(OperationalError):
+            self.view(OperationalError('no such table'))(self.request)
+        self.assertEqual(self.calls, 1)
+
+    def test_cache_changes_once_per_commit(self):
+        """Откаченная попытка не сдвигает счётчики лент и версии."""
+        author = get_user_model().objects.create_user(username='Автор')
+        cache.clear()
+        cache.set(feed_count_key('index'), 0)
+        before = versions.get_versions([INDEX_SCOPE])[INDEX_SCOPE]
+        errors = [OperationalError('database is locked')]
+
+        @retry_on_lock
+        def view(request):
+            Post.objects.create(text='Пост', author=author)
+            if errors:
+                raise errors.pop()
+            return HttpResponse('ok')
+
+        view(self.request)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(cache.get(feed_count_key('index')), 1)
+        self.assertEqual(
+            versions.get_versions([INDEX_SCOPE])[INDEX_SCOPE], before + 1)
+
+    def test_no_retry_inside_outer_transaction(self):
+        with self.assertRaises(OperationalError):
+            with transaction.atomic():
+                self.view(OperationalError('database is locked'))(
+                    self.request)
+        self.assertEqual(self.calls, 1)
+
+
+class BenchSqliteTest(SimpleTestCase):
+    def test_reports_both_profiles(self):
+        out = StringIO()
+        call_command(
+            'bench_sqlite', '--workers', '2', '--seconds', '0.2',
+            '--posts', '50', stdout=out)
+        self.assertIn('default:', out.getvalue())
+        self.assertIn('production:', out.getvalue())
@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.test import TestCase, override_settings
+
+from .. import thumbnails
+from ..models import MediaFile, Post
+from ..storage import post_image_storage
+from .test_thumbnails import uploaded_png
+
+User = get_user_model()
+
+RED = (255, 0, 0)
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch(
+            'django.db.transaction.on_commit', lambda func: func())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, name, color=(255, 0, 0)):
+        return Post.objects.create(
+            text='С картинкой', author=self.user,
+            image=uploaded_png(name, color))
+
+    def refcount(self, name):
+        return MediaFile.objects.get(name=name).refcount
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые байты под разными именами хранятся одним файлом."""
+        first = self.create('meme.png')
+        second = self.create('repost.png')
+        other = self.create('other.png', color=(0, 255, 0))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertEqual(self.refcount(first.image.name), 2)
+
+    def test_concurrent_identical_upload_reuses_file(self):
+        """Загрузка, не заметившая готовый файл, не зацикливается."""
+        name = post_image_storage.save('a.png', uploaded_png('a.png', RED))
+        large = TemporaryUploadedFile('b.png', 'image/png', None, None)
+        self.addCleanup(large.close)
+        large.write(uploaded_png('b.png', RED).read())
+        for content in (uploaded_png('c.png', RED), large):
+            with self.subTest(content=content), mock.patch.object(
+                    type(post_image_storage), 'exists', return_value=False):
+                self.assertEqual(
+                    post_image_storage.save('c.png', content), name)
+        directory = os.path.dirname(post_image_storage.path(name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
+
+    def test_file_is_deleted_with_last_reference(self):
+        first = self.create('meme.png')
+        second = self.create('repost.png')
+        name = first.image.name
+        thumbnails.generate(name)
+        ladder = thumbnails.card_files(name)
+        first.delete()
+        self.assertTrue(post_image_storage.exists(name))
+        self.assertEqual(self.refcount(name), 1)
+        second.delete()
+        self.assertFalse(post_image_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+        for thumbnail in ladder.values():
+            self.assertFalse(thumbnail.exists())
+
+    def test_replacing_image_moves_reference(self):
+        post = self.create('meme.png')
+        keeper = self.create('repost.png')
+        old_name = post.image.name
+        post.image = uploaded_png('new.png', color=(0, 0, 255))
+        post.save()
+        self.assertEqual(self.refcount(old_name), 1)
+        self.assertEqual(self.refcount(post.image.name), 1)
+        keeper.image = None
+        keeper.save()
+        self.assertFalse(post_image_storage.exists(old_name))
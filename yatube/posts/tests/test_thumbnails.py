@@ -0,0 +1,188 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from .. import thumbnails
+from ..conditional import post_pages
+from ..fragments import card_scope
+from ..models import Post
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def uploaded_gif(name='small.gif'):
+    return SimpleUploadedFile(
+        name=name, content=SMALL_GIF, content_type='image/gif')
+
+
+def uploaded_png(name, color):
+    """Картинка с уникальными байтами: одинаковые файлы хранятся один раз."""
+    buffer = BytesIO()
+    Image.new('RGB', (4, 2), color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_upload_enqueues_and_feed_shows_placeholder(self):
+        """До готовности миниатюры лента показывает заглушку."""
+        with mock.patch.object(thumbnails.worker, 'submit') as submit, \
+                mock.patch('django.db.transaction.on_commit',
+                           lambda func: func()):
+            self.client.post(reverse('new'), {
+                'text': 'С картинкой', 'image': uploaded_gif()})
+        post = Post.objects.get(text='С картинкой')
+        submit.assert_called_once()
+        self.assertEqual(submit.call_args[0][0], post.image.name)
+        with mock.patch('sorl.thumbnail.base.ThumbnailBackend.get_thumbnail',
+                        side_effect=AssertionError) as get_thumbnail:
+            response = self.client.get(reverse('index'))
+        get_thumbnail.assert_not_called()
+        self.assertContains(response, 'style="height: 339px"')
+        self.assertNotContains(response, '<img class="card-img"')
+
+    def test_generated_thumbnail_replaces_placeholder(self):
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=uploaded_gif())
+        self.client.get(reverse('index'))
+        thumbnails.generate(
+            post.image.name, [card_scope(post.pk)] + post_pages(post))
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<img class="card-img"')
+        ladder = thumbnails.ready_ladder(post.image)
+        self.assertEqual(sorted(ladder), list(thumbnails.CARD_WIDTHS))
+        self.assertContains(response, f'src="{ladder[960].url}"')
+        for width, thumbnail in ladder.items():
+            self.assertContains(response, f'{thumbnail.url} {width}w')
+
+    def test_ladder_is_built_from_one_decode(self):
+        """Все ширины srcset создаются из одного декодирования."""
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=uploaded_gif())
+        engine = thumbnails.default.engine.__class__
+        with mock.patch.object(
+                engine, 'get_image', autospec=True,
+                side_effect=engine.get_image) as get_image:
+            thumbnails.generate(post.image.name)
+            thumbnails.generate(post.image.name)
+        decodes = [call for call in get_image.call_args_list
+                   if call[0][1].name == post.image.name]
+        self.assertEqual(len(decodes), 1)
+        sizes = {width: tuple(thumbnail.size) for width, thumbnail
+                 in thumbnails.ready_ladder(post.image).items()}
+        self.assertEqual(
+            sizes, {320: (320, 113), 640: (640, 226), 960: (960, 339)})
+
+    def test_missing_thumbnail_is_requeued_once(self):
+        """Задача, потерянная с очередью процесса, ставится снова."""
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=uploaded_gif())
+        with mock.patch.object(thumbnails.worker, 'submit') as submit, \
+                mock.patch.object(thumbnails, 'in_memory_db',
+                                  return_value=False):
+            self.client.get(reverse('index'))
+            self.client.get(reverse('profile', args=[self.user.username]))
+        submit.assert_called_once_with(
+            post.image.name, [card_scope(post.pk)] + post_pages(post))
+        thumbnails.generate(post.image.name)
+        cache.clear()
+        with mock.patch.object(thumbnails.worker, 'submit') as submit, \
+                mock.patch.object(thumbnails, 'in_memory_db',
+                                  return_value=False):
+            self.client.get(reverse('index'))
+        submit.assert_not_called()
+
+    def test_edit_without_new_image_does_not_enqueue(self):
+        post = Post.objects.create(
+            text='С картинкой', author=self.user, image=uploaded_gif())
+        with mock.patch.object(thumbnails, 'enqueue') as enqueue:
+            self.client.post(
+                reverse('edit', args=[self.user.username, post.pk]),
+                {'text': 'Новый текст'})
+        enqueue.assert_not_called()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ThumbnailPrefetchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.user,
+                image=uploaded_png(f'small{i}.png', (i, 0, 0)))
+            for i in range(4)
+        ]
+        for post in cls.posts[:2]:
+            thumbnails.generate(post.image.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+
+    def kvstore_queries(self, queries):
+        return [query for query in queries
+                if 'thumbnail_kvstore' in query['sql']]
+
+    def test_page_is_resolved_in_one_lookup(self):
+        """Миниатюры страницы читаются одним запросом, затем из кэша."""
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(reverse('index'))
+        self.assertEqual(len(self.kvstore_queries(queries)), 1)
+        self.assertContains(response, '<img class="card-img"', count=2)
+        with CaptureQueriesContext(connection) as queries:
+            Client().get(reverse('profile', args=[self.user.username]))
+        self.assertEqual(self.kvstore_queries(queries), [])
+
+    def test_attach_matches_single_lookup(self):
+        posts = list(Post.objects.filter(author=self.user))
+        thumbnails.attach_thumbnails(posts)
+        for post in posts:
+            with self.subTest(post=post.text):
+                ready = thumbnails.ready_ladder(post.image)
+                self.assertEqual(
+                    {width: thumb.name
+                     for width, thumb in post.card_thumbnails.items()},
+                    {width: thumb.name for width, thumb in ready.items()})
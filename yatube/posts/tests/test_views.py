@@ -1,5 +1,7 @@
 import shutil
 import tempfile
+import warnings
+from unittest import mock
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -9,12 +11,24 @@ from django.core.paginator import Page
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Comment, Follow, Group, Post
+from ..counters import author_stats
+from ..models import Comment, Follow, Group, Post, TimelineEntry
 
 User = get_user_model()
 
 
+def commit_immediately(test):
+    """Сигналы меняют кэш после фиксации, а TestCase её не выполняет."""
+    patcher = mock.patch(
+        'django.db.transaction.on_commit', lambda func: func())
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
 class PostPagesTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -58,6 +72,7 @@ class PostPagesTests(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         cache.clear()
+        commit_immediately(self)
 
     def test_pages_use_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -145,17 +160,35 @@ class PostPagesTests(TestCase):
         self.assertEqual(post.author.username, self.user.username)
 
     def test_cache_index_page(self):
-        """Кэш страницы index работает верно"""
+        """Карточки index кэшируются до сохранения поста"""
+        self.authorized_client.get(reverse('index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Текст 2')
+        response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, self.post.text)
+        self.assertNotContains(response, 'Текст 2')
+
+        post = Post.objects.get(pk=self.post.pk)
+        post.save()
         response = self.authorized_client.get(reverse('index'))
-        cache_content = response.content
+        self.assertContains(response, 'Текст 2')
+
+    def test_index_shows_new_post_without_delay(self):
+        """Новый пост сразу появляется на index"""
+        self.authorized_client.get(reverse('index'))
         Post.objects.create(
             text='Текст 2',
             author=User.objects.get(username=self.user.username))
         response = self.authorized_client.get(reverse('index'))
-        self.assertEqual(cache_content, response.content)
-        cache.clear()
+        self.assertContains(response, 'Текст 2')
+
+    def test_cached_card_hides_foreign_edit_button(self):
+        """Кнопка редактирования не попадает в кэш к другим пользователям"""
+        edit_url = reverse('edit', kwargs={'username': self.user.username,
+                                           'post_id': self.post.id})
         response = self.authorized_client.get(reverse('index'))
-        self.assertNotEqual(cache_content, response.content)
+        self.assertContains(response, edit_url)
+        response = self.guest_client.get(reverse('index'))
+        self.assertNotContains(response, edit_url)
 
     def test_follow_profile(self):
         """Функция follow работают корректно"""
@@ -234,8 +267,433 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context.get('page').object_list), 10)
 
     def test_second_page_contains_three_records(self):
+        self.client.get(reverse('index'))
         response = self.client.get(reverse('index') + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+        self.assertNotContains(response, 'Тестовый текст 13')
         response = self.client.get(reverse(
             'profile', kwargs={'username': self.post.author}) + '?page=2')
         self.assertEqual(len(response.context.get('page').object_list), 3)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        for i in range(1, 14):
+            Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=cls.user
+            )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_cursor_pages_cover_feed(self):
+        """Курсорные страницы проходят ленту без пропусков и повторов."""
+        with self.settings(FEED_PAGINATION='cursor'):
+            response = self.client.get(reverse('index'))
+            first = response.context.get('page')
+            self.assertEqual(len(first), 10)
+            self.assertTrue(first.has_next())
+            self.assertFalse(first.has_previous())
+
+            response = self.client.get(
+                reverse('index') + f'?after={first.next_cursor}')
+            second = response.context.get('page')
+            self.assertEqual(len(second), 3)
+            self.assertFalse(second.has_next())
+
+            response = self.client.get(
+                reverse('index') + f'?before={second.previous_cursor}')
+            back = response.context.get('page')
+
+        texts = [post.text for post in list(first) + list(second)]
+        self.assertEqual(len(set(texts)), 13)
+        self.assertEqual(list(back), list(first))
+
+    def test_cursor_mode_by_token(self):
+        """Токен включает курсорный режим, мусорный токен — первая страница."""
+        response = self.client.get(
+            reverse('profile', kwargs={'username': self.user.username})
+            + '?after=мусор')
+        page = response.context.get('page')
+        self.assertTrue(page.is_cursor)
+        self.assertEqual(page[0].text, 'Тестовый текст 13')
+
+
+class FollowTimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.old_post = Post.objects.create(
+            text='Старый пост', author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def feed(self):
+        response = self.client.get(reverse('follow_index'))
+        return [post.text for post in response.context['page']]
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет посты автора в ленту, отписка убирает."""
+        self.client.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}))
+        self.assertEqual(self.feed(), ['Старый пост'])
+
+        Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
+
+        self.client.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    def test_popular_author_is_pulled_on_read(self):
+        """Посты популярного автора читаются напрямую, без раскладки."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.settings(TIMELINE_FANOUT_LIMIT=0):
+            Post.objects.create(text='Новый пост', author=self.author)
+            self.assertEqual(
+                TimelineEntry.objects.filter(user=self.reader).count(), 1)
+            self.assertEqual(self.feed(), ['Новый пост', 'Старый пост'])
+
+    def test_pull_mode_survives_losing_followers(self):
+        """Посты, вышедшие без раскладки, не пропадают после отписок."""
+        fan = User.objects.create_user(username='Поклонник')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        with self.settings(TIMELINE_FANOUT_LIMIT=1):
+            Post.objects.create(text='Новый пост', author=self.author)
+            Follow.objects.filter(user=fan).delete()
+            Post.objects.create(text='Ещё пост', author=self.author)
+            self.assertEqual(
+                self.feed(), ['Ещё пост', 'Новый пост', 'Старый пост'])
+
+
+class CommentCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_add_comment_increments_counter(self):
+        """add_comment увеличивает Post.comment_count."""
+        self.authorized_client.post(
+            reverse('add_comment', kwargs={'username': self.user.username,
+                                           'post_id': self.post.id}),
+            data={'text': 'комментарий'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+        Comment.objects.get(post=self.post).delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_feed_renders_counter_without_comment_queries(self):
+        """Карточки ленты не обращаются к таблице Comment."""
+        Comment.objects.create(
+            post=self.post, author=self.user, text='комментарий')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(reverse('index'))
+        self.assertContains(response, 'Комментариев: 1')
+        self.assertFalse(any(
+            'posts_comment' in query['sql'] for query in queries))
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Автор')
+        cls.reader = User.objects.create_user(username='Читатель')
+        Post.objects.create(text='Тестовый текст', author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def stats(self):
+        response = self.client.get(reverse(
+            'profile', kwargs={'username': self.author.username}))
+        stats = response.context['stats']
+        return stats.followers_count, stats.following_count, stats.posts_count
+
+    def test_stats_follow_writes(self):
+        """Счётчики профиля обновляются подпиской, отпиской и постом."""
+        self.assertEqual(self.stats(), (0, 0, 1))
+        self.client.get(reverse(
+            'profile_follow', kwargs={'username': self.author.username}))
+        Post.objects.create(text='Второй пост', author=self.author)
+        self.assertEqual(self.stats(), (1, 0, 2))
+        self.client.get(reverse(
+            'profile_unfollow', kwargs={'username': self.author.username}))
+        self.assertEqual(self.stats(), (0, 0, 2))
+
+    def test_author_card_without_aggregates(self):
+        """Строку AuthorStats создаёт регистрация, а не первое чтение."""
+        post = self.author.posts.first()
+        url = reverse('post', kwargs={'username': self.author.username,
+                                      'post_id': post.id})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] or 'INSERT' in query['sql']
+            for query in queries))
+
+    def test_stats_fallback_for_bulk_created_users(self):
+        """Пользователь, созданный bulk_create, получает строку при чтении."""
+        User.objects.bulk_create([User(username='Импорт')])
+        imported = User.objects.get(username='Импорт')
+        Follow.objects.create(user=imported, author=self.author)
+        self.assertEqual(
+            author_stats(imported.pk).following_count, 1)
+
+
+class CachedCountPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        for i in range(1, 14):
+            Post.objects.create(text=f'Тестовый текст {i}', author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        commit_immediately(self)
+
+    def test_count_is_served_from_cache(self):
+        """Повторный запрос ленты не выполняет COUNT(*)."""
+        self.client.get(reverse('index'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index') + '?page=2')
+        self.assertEqual(response.context['page'].paginator.count, 13)
+        self.assertFalse(any(
+            'COUNT(' in query['sql'] for query in queries))
+
+    def test_count_follows_writes(self):
+        """Счётчик ленты меняется при создании и удалении постов."""
+        self.client.get(reverse('index'))
+        post = Post.objects.create(text='Текст 14', author=self.user)
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['page'].paginator.count, 14)
+        post.delete()
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['page'].paginator.count, 13)
+
+    def test_follow_count_sees_new_posts(self):
+        """Новые посты автора сразу попадают в счётчик ленты подписок."""
+        reader = User.objects.create_user(username='Читатель')
+        Follow.objects.create(user=reader, author=self.user)
+        self.client.force_login(reader)
+        response = self.client.get(reverse('follow_index'))
+        self.assertEqual(response.context['page'].paginator.count, 13)
+        for i in range(5):
+            Post.objects.create(text=f'Новый {i}', author=self.user)
+        response = self.client.get(reverse('follow_index') + '?page=2')
+        self.assertEqual(response.context['page'].paginator.count, 18)
+        self.assertEqual(len(response.context['page']), 8)
+
+
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        cls.post = Post.objects.create(text='Тестовый текст', author=cls.user)
+        for i in range(1, 26):
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'комментарий {i}')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_post_shows_first_batch(self):
+        """Страница поста показывает первую порцию новых комментариев."""
+        response = self.client.get(reverse(
+            'post', kwargs={'username': self.user.username,
+                            'post_id': self.post.id}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), settings.COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, 'комментарий 25')
+        self.assertContains(response, 'Показать ещё')
+
+    def test_fragment_returns_next_batch(self):
+        """Фрагмент отдаёт оставшиеся комментарии без кнопки."""
+        response = self.client.get(reverse(
+            'post', kwargs={'username': self.user.username,
+                            'post_id': self.post.id}))
+        cursor = response.context['comments'].next_cursor
+        url = reverse('post_comments', kwargs={
+            'username': self.user.username, 'post_id': self.post.id})
+        response = self.client.get(f'{url}?after={cursor}')
+        self.assertTemplateUsed(response, 'includes/comment_list.html')
+        texts = [item.text for item in response.context['comments']]
+        self.assertEqual(
+            texts, [f'комментарий {i}' for i in range(5, 0, -1)])
+        self.assertNotContains(response, 'Показать ещё')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.group = Group.objects.create(
+            title='Группа', description='Описание', slug='etag-group')
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        commit_immediately(self)
+        self.urls = [
+            reverse('index'),
+            reverse('group_posts', kwargs={'slug': self.group.slug}),
+            reverse('profile', kwargs={'username': self.user.username}),
+            reverse('post', kwargs={'username': self.user.username,
+                                    'post_id': self.post.id}),
+        ]
+
+    def test_version_keys_are_memcached_safe(self):
+        """Имена пользователей с пробелами и кириллицей не попадают в ключи."""
+        author = User.objects.create_user(username='Автор 8')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.client.get(
+                reverse('profile', kwargs={'username': author.username}))
+            Post.objects.create(text='Пост', author=author)
+        self.assertFalse([
+            warning for warning in caught
+            if issubclass(warning.category, CacheKeyWarning)])
+
+    def test_matching_etag_returns_304_without_queries(self):
+        """Повторный запрос с If-None-Match не обращается к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(len(queries), 0)
+
+    def test_writes_change_etag(self):
+        """Новый пост и комментарий меняют ETag затронутых страниц."""
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls}
+        Post.objects.create(
+            text='Новый пост', author=self.user, group=self.group)
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, 200)
+        post_url = self.urls[3]
+        etag = self.client.get(post_url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        response = self.client.get(post_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """Гость и авторизованный пользователь получают разные ETag."""
+        anonymous = self.client.get(self.urls[0])['ETag']
+        self.client.force_login(self.reader)
+        response = self.client.get(
+            self.urls[0], HTTP_IF_NONE_MATCH=anonymous)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], anonymous)
+
+
+class AnonymousPageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Хаски')
+        cls.reader = User.objects.create_user(username='Читатель')
+        cls.group = Group.objects.create(
+            title='Группа', description='Описание', slug='cached-group')
+        cls.other_group = Group.objects.create(
+            title='Другая', description='Описание', slug='other-group')
+        Post.objects.create(
+            text='Тестовый текст', author=cls.user, group=cls.group)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        commit_immediately(self)
+        self.index = reverse('index')
+        self.group_url = reverse(
+            'group_posts', kwargs={'slug': self.group.slug})
+        self.other_group_url = reverse(
+            'group_posts', kwargs={'slug': self.other_group.slug})
+        self.profile = reverse(
+            'profile', kwargs={'username': self.user.username})
+
+    def test_hit_skips_view(self):
+        """Повторный запрос гостя отдаётся из кэша без запросов к базе."""
+        for url in (self.index, self.group_url, self.profile):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    second = self.client.get(url)
+                self.assertEqual(len(queries), 0)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_query_string_is_part_of_key(self):
+        self.client.get(self.index)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(f'{self.index}?page=1')
+        self.assertGreater(len(queries), 0)
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.get(self.index)
+        self.client.force_login(self.reader)
+        response = self.client.get(self.index)
+        self.assertIn('page', response.context)
+
+    def test_writes_purge_affected_pages_only(self):
+        """Новый пост сбрасывает индекс, группу и профиль, но не чужое."""
+        for url in (self.index, self.group_url, self.profile,
+                    self.other_group_url):
+            self.client.get(url)
+        Post.objects.create(
+            text='Свежий пост', author=self.user, group=self.group)
+        for url in (self.index, self.group_url, self.profile):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Свежий пост')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.other_group_url)
+        self.assertEqual(len(queries), 0)
+
+    def test_follow_and_comment_purge_profile(self):
+        post = Post.objects.filter(author=self.user).first()
+        self.client.get(self.profile)
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.client.get(self.profile)
+        self.assertEqual(response.context['stats'].followers_count, 1)
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        response = self.client.get(self.profile)
+        self.assertIsNotNone(response.context)
@@ -0,0 +1,268 @@
+"""Миниатюры постов, подготовленные вне запроса.
+
+new_post и post_edit ставят загруженное изображение в очередь фонового
+потока, который создаёт миниатюры через движок sorl-thumbnail: набор
+ширин CARD_WIDTHS для srcset из одного декодирования исходника. Шаблоны
+только ищут готовые миниатюры в key-value хранилище sorl и до их
+появления показывают заглушку, поэтому запросы лент не декодируют
+изображения.
+
+Очередь живёт в памяти процесса и пропадает при перезапуске, поэтому
+страница с заглушкой сама возвращает изображение в очередь, см. requeue.
+"""
+import hashlib
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore as CachedDBStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import versions
+from .conditional import post_pages
+from .fragments import card_scope
+from .storage import post_image_storage
+
+logger = logging.getLogger(__name__)
+
+CARD_WIDTHS = (320, 640, 960)
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+REQUEUE_KEY = 'thumbnail-requeue:{}'
+
+
+def card_geometry(width):
+    """Геометрия ступени srcset с пропорциями карточки 960x339."""
+    return f'{width}x{round(width * 339 / 960)}'
+
+
+CARD_GEOMETRY = card_geometry(max(CARD_WIDTHS))
+
+
+def thumbnail_options(source, options=CARD_OPTIONS):
+    """Опции, которые подставит ThumbnailBackend.get_thumbnail."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def source_file(image):
+    """Исходник всегда с хранилищем Post.image.
+
+    Хранилище входит в ключ sorl, поэтому имя строкой и FieldFile должны
+    давать одинаковые ключи миниатюр.
+    """
+    return ImageFile(image, post_image_storage)
+
+
+def thumbnail_file(image, geometry=CARD_GEOMETRY, options=CARD_OPTIONS):
+    """ImageFile миниатюры под тем именем, которое даст sorl.
+
+    Ничего не читает и не создаёт.
+    """
+    source = source_file(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options))
+    return ImageFile(name, default.storage)
+
+
+def card_files(image):
+    """Ступени srcset карточки: {ширина: ImageFile}."""
+    return {width: thumbnail_file(image, card_geometry(width))
+            for width in CARD_WIDTHS}
+
+
+def ready_ladder(image):
+    """Готовые ступени карточки одного изображения."""
+    if not image:
+        return {}
+    found = {width: default.kvstore.get(thumbnail)
+             for width, thumbnail in card_files(image).items()}
+    return {width: thumbnail for width, thumbnail in found.items()
+            if thumbnail}
+
+
+def ready_thumbnails(images):
+    """Готовые ступени карточек: {имя изображения: {ширина: ImageFile}}.
+
+    Для cached_db хранилища sorl все ключи читаются одним get_many из
+    кэша, а промахи — одним запросом к таблице KVStore. Отсутствующие
+    записи кэшируются пустыми, как это делает сам sorl.
+    """
+    images = [image for image in images if image]
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBStore):
+        return {image.name: ready_ladder(image) for image in images}
+    keys = {}
+    for image in images:
+        for width, thumbnail in card_files(image).items():
+            keys[add_prefix(thumbnail.key)] = (image.name, width)
+    values = kvstore.cache.get_many(list(keys))
+    missing = [key for key in keys if key not in values]
+    if missing:
+        stored = dict(
+            KVStoreModel.objects.filter(key__in=missing)
+            .values_list('key', 'value'))
+        values.update(stored)
+        kvstore.cache.set_many(
+            {key: stored.get(key, EMPTY_VALUE) for key in missing},
+            sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+    ready = {}
+    for key, value in values.items():
+        if value != EMPTY_VALUE:
+            name, width = keys[key]
+            ready.setdefault(name, {})[width] = deserialize_image_file(value)
+    return ready
+
+
+def attach_thumbnails(posts):
+    """Проставляет post.card_thumbnails для всех постов страницы сразу.
+
+    Вызывается до кэша карточек, поэтому недостающие миниатюры снова
+    ставятся в очередь, даже если заглушка уже закэширована.
+    """
+    ready = ready_thumbnails(post.image for post in posts)
+    for post in posts:
+        post.card_thumbnails = ready.get(post.image.name, {})
+        requeue(post, post.card_thumbnails)
+    return posts
+
+
+def largest_with_srcset(ladder):
+    """Самая крупная готовая ступень с атрибутом srcset или None."""
+    if not ladder:
+        return None
+    thumbnail = ladder[max(ladder)]
+    thumbnail.srcset = ', '.join(
+        f'{ladder[width].url} {width}w' for width in sorted(ladder))
+    return thumbnail
+
+
+def generate(image_name, scopes=(), force=False):
+    """Создаёт все ступени карточки из одного декодирования исходника.
+
+    Затем сбрасывает закэшированные страницы с заглушкой. force
+    пересоздаёт и уже известные хранилищу миниатюры, например после
+    восстановления media из резервной копии.
+    """
+    source = source_file(image_name)
+    missing = [
+        (card_geometry(width), thumbnail)
+        for width, thumbnail in card_files(image_name).items()
+        if force or not default.kvstore.get(thumbnail)
+    ]
+    # Файл, о котором не знает хранилище, только регистрируется: иначе
+    # storage.save дал бы новой миниатюре имя с суффиксом
+    pending = []
+    for geometry, thumbnail in missing:
+        if force and thumbnail.exists():
+            thumbnail.delete()
+        if not thumbnail.exists():
+            pending.append((geometry, thumbnail))
+    if pending:
+        source_image = default.engine.get_image(source)
+        try:
+            source.set_size(default.engine.get_image_size(source_image))
+            options = thumbnail_options(source)
+            options['image_info'] = default.engine.get_image_info(
+                source_image)
+            for geometry, thumbnail in pending:
+                default.backend._create_thumbnail(
+                    source_image, geometry, options, thumbnail)
+        finally:
+            default.engine.cleanup(source_image)
+    if missing:
+        default.kvstore.get_or_set(source)
+        for _, thumbnail in missing:
+            default.kvstore.set(thumbnail, source)
+    versions.bump(*scopes)
+
+
+def in_memory_db():
+    is_in_memory = getattr(connection, 'is_in_memory_db', None)
+    return is_in_memory is not None and is_in_memory()
+
+
+class ThumbnailWorker:
+    """Фоновый поток процесса, создающий миниатюры по очереди."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def submit(self, image_name, scopes):
+        if in_memory_db():
+            # Второе соединение к общей памяти SQLite упирается в
+            # табличные блокировки, поэтому работа выполняется на месте
+            self.process(image_name, scopes)
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='thumbnails', daemon=True)
+                self.thread.start()
+        self.queue.put((image_name, scopes))
+
+    def run(self):
+        while True:
+            image_name, scopes = self.queue.get()
+            try:
+                self.process(image_name, scopes)
+            finally:
+                connection.close()
+                self.queue.task_done()
+
+    def process(self, image_name, scopes):
+        try:
+            generate(image_name, scopes)
+        except Exception:
+            logger.exception('Не удалось создать миниатюру %s', image_name)
+
+
+worker = ThumbnailWorker()
+
+
+def enqueue(post):
+    """Ставит миниатюру поста в очередь после фиксации транзакции."""
+    if not post.image:
+        return
+    image_name = post.image.name
+    scopes = [card_scope(post.pk)] + post_pages(post)
+    transaction.on_commit(lambda: worker.submit(image_name, scopes))
+
+
+def requeue(post, ladder):
+    """Возвращает в очередь изображение карточки без полного набора ступеней.
+
+    Метка в общем кэше пропускает повторы из всех процессов, пока задача
+    ждёт своей очереди или после неудачи, до истечения
+    THUMBNAIL_REQUEUE_TIMEOUT.
+    """
+    if not post.image or len(ladder) == len(CARD_WIDTHS):
+        return
+    if in_memory_db():
+        # Без потока миниатюры создаются при загрузке, терять нечего,
+        # а создавать их посреди отрисовки страницы нельзя
+        return
+    image_name = post.image.name
+    key = REQUEUE_KEY.format(hashlib.md5(image_name.encode()).hexdigest())
+    timeout = getattr(settings, 'THUMBNAIL_REQUEUE_TIMEOUT', 300)
+    if cache.add(key, True, timeout):
+        worker.submit(image_name, [card_scope(post.pk)] + post_pages(post))
@@ -0,0 +1,125 @@
+"""Лента подписок, собранная при записи (fan-out on write).
+
+Новый пост раскладывается в TimelineEntry каждого подписчика, поэтому
+follow_index читает одну таблицу по индексу (user, -pub_date) вместо
+соединения Follow и Post. Посты авторов, у которых подписчиков больше
+TIMELINE_FANOUT_LIMIT, не раскладываются, а подмешиваются при чтении.
+Режим решается только по AuthorStats и остаётся включённым, даже если
+подписчиков снова станет меньше: иначе посты, вышедшие без раскладки,
+пропали бы из лент.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+
+from .counters import author_stats, fanout_limit
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+FEED_KEYS = ('feed_date', 'feed_post')
+
+
+def is_pull_author(author_id):
+    """Включает режим чтения напрямую при превышении лимита подписчиков."""
+    stats = author_stats(author_id)
+    if stats.pull_timeline:
+        return True
+    if stats.followers_count <= fanout_limit():
+        return False
+    AuthorStats.objects.filter(pk=author_id).update(pull_timeline=True)
+    return True
+
+
+def pull_authors(user):
+    """Авторы из подписок user, чьи посты читаются напрямую."""
+    return AuthorStats.objects.filter(
+        user__following__user=user, pull_timeline=True,
+    ).values_list('user_id', flat=True)
+
+
+def fan_out(post):
+    if is_pull_author(post.author_id):
+        return
+    follower_ids = (
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    batch = []
+    for user_id in follower_ids:
+        batch.append(TimelineEntry(
+            user_id=user_id, post=post, pub_date=post.pub_date))
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту user последние посты нового автора."""
+    if is_pull_author(author_id):
+        return
+    limit = getattr(settings, 'TIMELINE_BACKFILL', 1000)
+    posts = (
+        Post.objects.filter(author_id=author_id)
+        .values_list('pk', 'pub_date')[:limit]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def trim(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+@transaction.atomic
+def rebuild(batch_size=BATCH_SIZE):
+    """Раскладывает заново все ленты по Follow и Post.
+
+    Нужна после массовой загрузки мимо сигналов. Посты авторов с
+    pull_timeline не раскладываются, поэтому AuthorStats должны быть
+    пересчитаны до вызова.
+    """
+    TimelineEntry.objects.all().delete()
+    entries = (
+        Post.objects.filter(author__following__isnull=False)
+        .exclude(author__stats__pull_timeline=True)
+        .values_list('author__following__user_id', 'pk', 'pub_date')
+        .iterator(chunk_size=batch_size)
+    )
+    total = 0
+    batch = []
+    for user_id, post_id, pub_date in entries:
+        batch.append(TimelineEntry(
+            user_id=user_id, post_id=post_id, pub_date=pub_date))
+        if len(batch) >= batch_size:
+            TimelineEntry.objects.bulk_create(batch)
+            total += len(batch)
+            batch = []
+    TimelineEntry.objects.bulk_create(batch)
+    return total + len(batch)
+
+
+def follow_feed(user):
+    """Лента подписок, упорядоченная по FEED_KEYS.
+
+    Ключи сортировки берутся из TimelineEntry, чтобы страницу отдавал
+    индекс (user, -pub_date, -post) без сортировки во временной таблице.
+    """
+    pulled = list(pull_authors(user))
+    if not pulled:
+        feed = Post.objects.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_post=F('timeline_entries__post_id'),
+        )
+    else:
+        pushed = TimelineEntry.objects.filter(user=user).values('post')
+        feed = Post.objects.filter(
+            Q(pk__in=pushed) | Q(author__in=pulled)
+        ).annotate(feed_date=F('pub_date'), feed_post=F('id'))
+    return feed.order_by(*(f'-{key}' for key in FEED_KEYS))
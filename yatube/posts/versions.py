@@ -0,0 +1,50 @@
+"""Счётчики версий в кэше для инвалидации по ключу.
+
+Новая версия начинается с текущего времени в миллисекундах: если кэш
+вытеснит счётчик, версия не совпадёт ни с одним из выданных ранее.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = 'version:{}'
+# Длинные ключи memcached отвергает, оставляем запас на префикс кэша
+MAX_PLAIN_SCOPE = 200
+
+
+def version_key(scope):
+    """Ключ версии области.
+
+    Области с именами пользователей и slug групп могут содержать пробелы
+    и не-ASCII символы, недопустимые в ключах memcached; такие области
+    заменяются хэшем.
+    """
+    if (scope.isascii() and scope.isprintable() and ' ' not in scope
+            and len(scope) <= MAX_PLAIN_SCOPE):
+        return VERSION_KEY.format(scope)
+    return VERSION_KEY.format('md5:' + hashlib.md5(scope.encode()).hexdigest())
+
+
+def new_version():
+    return int(time.time() * 1000)
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_version(), None)
+
+
+def get_versions(scopes):
+    """Версии для набора областей одним обращением к кэшу."""
+    keys = {version_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    missing = {key: new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for key, scope in keys.items()}
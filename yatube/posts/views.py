@@ -1,41 +1,59 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 
+from . import export, feeds, thumbnails
+from .conditional import (AUTHOR_SCOPE, GROUP_SCOPE, INDEX_SCOPE,
+                          POST_SCOPE, page_etag)
+from .counters import author_stats
+from .decorators import query_budget, retry_on_lock
 from .forms import PostForm, CommentForm
-from .models import Comment, Follow, Group, Post, User
+from .fragments import attach_card_versions
+from .models import Follow, Group, Post, User
+from .pagecache import anonymous_cache
+from .pagination import CursorPaginator, get_page
+from .search import search_posts
 
 
+@query_budget(5)
+@page_etag(INDEX_SCOPE)
+@anonymous_cache(INDEX_SCOPE)
 def index(request):
-    post_list = Post.objects.select_related('group')
-    paginator = Paginator(post_list, settings.PER_PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post_list = feeds.index_feed()
+    page = get_page(request, post_list, 'index', estimate=True)
+    attach_card_versions(page)
+    thumbnails.attach_thumbnails(page)
     return render(
         request, 'index.html',
         {'page': page}
     )
 
 
+@query_budget(5)
+@page_etag(GROUP_SCOPE)
+@anonymous_cache(GROUP_SCOPE)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.post_set.all()
-    paginator = Paginator(posts, settings.PER_PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = feeds.group_feed(group)
+    page = get_page(request, posts, f'group:{group.pk}')
+    thumbnails.attach_thumbnails(page)
     return render(
         request, 'group.html',
         {'group': group, 'page': page, }
     )
 
 
+@query_budget(12)
+@page_etag(AUTHOR_SCOPE)
+@anonymous_cache(AUTHOR_SCOPE)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts_of_author = author.posts.all()
-    paginator = Paginator(posts_of_author, settings.PER_PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts_of_author = feeds.author_feed(author)
+    page = get_page(request, posts_of_author, f'author:{author.pk}')
+    attach_card_versions(page)
+    thumbnails.attach_thumbnails(page)
     form = CommentForm()
     following = False
     if request.user.is_authenticated:
@@ -43,33 +61,60 @@ def profile(request, username):
             following = True
     return render(
         request, 'posts/profile.html',
-        {'author': author,
+        {'author': author, 'stats': author_stats(author.pk),
          'page': page, 'form': form,
          'following': following
          }
     )
 
 
+@query_budget(10)
+@page_etag(AUTHOR_SCOPE, POST_SCOPE)
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, id=post_id)
-    comments = Comment.objects.filter(post=post)
+    post = get_object_or_404(
+        Post.objects.select_related(*feeds.FEED_RELATED),
+        author__username=username, id=post_id)
+    comments = comments_page(request, post)
+    attach_card_versions([post])
+    thumbnails.attach_thumbnails([post])
     form = CommentForm(request.POST or None)
     return render(
         request, 'posts/post.html',
         {'form': form, 'post': post,
-         'author': post.author, 'post_id': post_id,
+         'author': post.author, 'stats': author_stats(post.author_id),
+         'post_id': post_id,
          'username': username, 'comments': comments
          }
     )
 
 
+def comments_page(request, post):
+    paginator = CursorPaginator(
+        feeds.post_comments(post), settings.COMMENTS_PER_PAGE,
+        feeds.COMMENT_KEYS)
+    return paginator.get_page(after=request.GET.get('after'))
+
+
+@query_budget(4)
+def post_comments(request, username, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    post = get_object_or_404(Post, author__username=username, id=post_id)
+    return render(
+        request, 'includes/comment_list.html',
+        {'post': post, 'comments': comments_page(request, post)}
+    )
+
+
+@query_budget(12)
 @login_required
+@retry_on_lock
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.enqueue(post)
         return redirect('index')
     return render(
         request, 'posts/new.html',
@@ -77,7 +122,9 @@ def new_post(request):
     )
 
 
+@query_budget(8)
 @login_required
+@retry_on_lock
 def post_edit(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
     if post.author != request.user:
@@ -85,7 +132,9 @@ def post_edit(request, username, post_id):
     form = PostForm(
         request.POST or None, files=request.FILES or None, instance=post)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.enqueue(post)
         return redirect('post', username, post_id)
 
     return render(
@@ -107,7 +156,9 @@ def server_error(request):
     return render(request, 'misc/500.html', status=500)
 
 
+@query_budget(6)
 @login_required
+@retry_on_lock
 def add_comment(request, username, post_id):
     post = get_object_or_404(Post, author__username=username, id=post_id)
     form = CommentForm(request.POST or None)
@@ -119,17 +170,36 @@ def add_comment(request, username, post_id):
     return redirect('post', username=username, post_id=post_id)
 
 
+@query_budget(5)
 @login_required
 def follow_index(request):
     user = request.user
-    post = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post, settings.PER_PAGE_COUNT)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    post = feeds.subscriptions_feed(user)
+    # Ленту подписок меняют посты всех авторов, включая читаемых
+    # напрямую, поэтому её счётчик не кэшируется
+    page = get_page(request, post, None,
+                    cursor_keys=feeds.SUBSCRIPTIONS_KEYS)
+    attach_card_versions(page)
+    thumbnails.attach_thumbnails(page)
     return render(request, 'follow.html', {'page': page, 'user': user})
 
 
+@query_budget(6)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search_posts(query), settings.PER_PAGE_COUNT)
+    page = paginator.get_page(request.GET.get('page'))
+    attach_card_versions(page)
+    thumbnails.attach_thumbnails(page)
+    return render(
+        request, 'posts/search.html',
+        {'page': page, 'query': query}
+    )
+
+
+@query_budget(12)
 @login_required
+@retry_on_lock
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
@@ -139,9 +209,28 @@ def profile_follow(request, username):
     return redirect('profile', username=username)
 
 
+@query_budget(10)
 @login_required
+@retry_on_lock
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follow = Follow.objects.filter(author=author, user=request.user)
     follow.delete()
     return redirect('profile', username=username)
+
+
+@query_budget(4)
+@login_required
+def export_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        return redirect('profile', username=username)
+    fmt = request.GET.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        fmt = 'ndjson'
+    response = StreamingHttpResponse(
+        export.render(export.user_records(author), fmt),
+        content_type=export.FORMATS[fmt])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{author.pk}-posts.{fmt}"')
+    return response
@@ -0,0 +1,378 @@
+"""Двухуровневый кэш: LRU в памяти процесса перед общим хранилищем.
+
+Каждый воркер gunicorn держит небольшой локальный LRU, а общий уровень
+(бэкенд из CACHES, по умолчанию SQLiteCache ниже) виден всем процессам.
+Общий уровень должен увеличивать числа атомарно: на incr держатся
+версии страниц, счётчики лент и поколение локальных уровней.
+
+Согласованность между воркерами:
+
+* set/add пишут в оба уровня, локальная копия живёт не дольше
+  LOCAL_TIMEOUT секунд;
+* целые числа (счётчики версий) всегда читаются из общего уровня, поэтому
+  увеличение версии сразу видно всем воркерам;
+* delete и clear меняют общий счётчик поколения. Воркер сверяет его не
+  реже раза в SYNC_INTERVAL секунд и при расхождении сбрасывает свой
+  локальный уровень.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+GENERATION_KEY = 'two_tier:generation'
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = location
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._sync_interval = float(options.get('SYNC_INTERVAL', 1))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = None
+        self._synced_at = 0
+        self._stats = {
+            'local': {'hits': 0, 'misses': 0},
+            'shared': {'hits': 0, 'misses': 0},
+        }
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def stats(self):
+        with self._lock:
+            return {tier: dict(counts) for tier, counts in self._stats.items()}
+
+    def _count(self, tier, hit):
+        with self._lock:
+            self._stats[tier]['hits' if hit else 'misses'] += 1
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self._sync_interval:
+            return
+        generation = self.shared.get(GENERATION_KEY)
+        with self._lock:
+            if generation != self._generation:
+                self._local.clear()
+                self._generation = generation
+            self._synced_at = now
+
+    def _broadcast(self):
+        try:
+            self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            # После clear поколение не должно совпасть с прежним
+            self.shared.set(GENERATION_KEY, int(time.time() * 1000), None)
+        with self._lock:
+            self._local.clear()
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return False, None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._local[key]
+                return False, None
+            self._local.move_to_end(key)
+            return True, value
+
+    def _local_set(self, key, value, timeout):
+        if isinstance(value, int):
+            return
+        lifetime = self._local_timeout
+        if timeout is not None:
+            lifetime = min(lifetime, timeout)
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._local[key] = (value, time.monotonic() + lifetime)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def _timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            return self.default_timeout
+        return timeout
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        local_key = self.make_key(key, version=version)
+        found, value = self._local_get(local_key)
+        self._count('local', found)
+        if found:
+            return value
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        self._count('shared', value is not sentinel)
+        if value is sentinel:
+            return default
+        self._local_set(local_key, value, self.default_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        result = {}
+        missing = []
+        for key in keys:
+            found, value = self._local_get(self.make_key(key, version))
+            self._count('local', found)
+            if found:
+                result[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key in missing:
+                self._count('shared', key in shared)
+            for key, value in shared.items():
+                self._local_set(
+                    self.make_key(key, version), value, self.default_timeout)
+            result.update(shared)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self.make_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(self.make_key(key, version), value, timeout)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        failed = self.shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            if key not in (failed or []):
+                self._local_set(self.make_key(key, version), value, timeout)
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self.shared.delete(key, version=version)
+        self._local_delete(self.make_key(key, version))
+        self._broadcast()
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        self._broadcast()
+
+    def has_key(self, key, version=None):
+        found, _ = self._local_get(self.make_key(key, version))
+        return found or self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        # Числа не попадают в локальный уровень, рассылать нечего
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        self.shared.clear()
+        self._broadcast()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class SQLiteCache(BaseCache):
+    """Общий кэш процессов в файле SQLite.
+
+    В отличие от FileBasedCache, incr выполняется одним UPDATE внутри
+    транзакции на запись и не теряет увеличения параллельных воркеров,
+    а срок жизни ключа при этом не меняется. Целые числа хранятся как
+    INTEGER, остальные значения — как pickle. Устаревшие и лишние сверх
+    MAX_ENTRIES записи удаляются раз в CULL_EVERY записей процесса.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._cull_every = int(options.get('CULL_EVERY', 100))
+        self._writes = 0
+        self._connections = threading.local()
+
+    def _db(self):
+        # Соединение SQLite нельзя переносить через fork, поэтому оно
+        # своё у каждого потока каждого процесса
+        pid = os.getpid()
+        if getattr(self._connections, 'pid', None) != pid:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            db = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode = WAL')
+            db.execute('PRAGMA synchronous = NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value, expires REAL)')
+            db.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._connections.db = db
+            self._connections.pid = pid
+        return self._connections.db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _encode(value):
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _decode(value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _wrote(self, db):
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull(db)
+
+    def _cull(self, db):
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        # Первыми уходят записи, которым и так скоро истекать; бессрочные
+        # (версии страниц) — последними
+        db.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+            'ORDER BY expires IS NULL, expires LIMIT ?)',
+            (max(count - self._max_entries, count // self._cull_frequency),))
+
+    def get(self, key, default=None, version=None):
+        row = self._db().execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())).fetchone()
+        if row is None:
+            return default
+        return self._decode(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        names = list(keys)
+        result = {}
+        db = self._db()
+        # Запас до лимита переменных в старых сборках SQLite
+        for start in range(0, len(names), 500):
+            chunk = names[start:start + 500]
+            rows = db.execute(
+                'SELECT key, value FROM cache WHERE key IN ({}) '
+                'AND (expires IS NULL OR expires > ?)'.format(
+                    ', '.join('?' * len(chunk))),
+                chunk + [time.time()])
+            for name, value in rows:
+                result[keys[name]] = self._decode(value)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        db = self._db()
+        db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (self._key(key, version), self._encode(value),
+             self.get_backend_timeout(timeout)))
+        self._wrote(db)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        with self._transaction() as db:
+            db.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                [(self._key(key, version), self._encode(value), expires)
+                 for key, value in data.items()])
+        self._wrote(db)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        db = self._db()
+        added = db.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (self._key(key, version), self._encode(value),
+             self.get_backend_timeout(timeout), now)).rowcount == 1
+        if added:
+            self._wrote(db)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE cache SET value = value + ? WHERE key = ? "
+                "AND typeof(value) = 'integer' "
+                "AND (expires IS NULL OR expires > ?)",
+                (delta, key, time.time())).rowcount
+            if not updated:
+                raise ValueError(f"Key '{key}' not found")
+            return db.execute(
+                'SELECT value FROM cache WHERE key = ?', (key,)).fetchone()[0]
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self._db().execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), self._key(key, version),
+             time.time())).rowcount == 1
+
+    def delete(self, key, version=None):
+        self._db().execute(
+            'DELETE FROM cache WHERE key = ?', (self._key(key, version),))
+
+    def delete_many(self, keys, version=None):
+        with self._transaction() as db:
+            db.executemany(
+                'DELETE FROM cache WHERE key = ?',
+                [(self._key(key, version),) for key in keys])
+
+    def has_key(self, key, version=None):
+        return self._db().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._key(key, version), time.time())).fetchone() is not None
+
+    def clear(self):
+        self._db().execute('DELETE FROM cache')
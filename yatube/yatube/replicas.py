@@ -0,0 +1,113 @@
+"""Чтение с реплики с гарантией «читаю свои записи».
+
+Безопасные запросы (GET, HEAD) читают с алиаса REPLICA_DATABASE, всё
+остальное идёт в default. Запрос, который что-то записал, до конца
+работает с default и ставит cookie REPLICA_PIN_COOKIE: следующие
+REPLICA_STICKY_SECONDS секунд этот браузер читает только с default и
+не увидит отставшую реплику. Пока REPLICA_DATABASE не задан, роутер
+ничего не меняет.
+
+Реплика может отставать от default, а версии страниц и карточек
+сигналы увеличивают сразу после фиксации. Поэтому всё, что попадёт в
+кэш под текущей версией, читается с default (primary_reads): страница
+гостя при промахе кэша и карточки без готового фрагмента. Ответ,
+собранный из чтений с реплики, не получает ETag (см. read_replica).
+
+Локально реплику заменяет второй файл SQLite, который заполняет команда
+sync_replica.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+REPLICA_PIN_COOKIE = 'primary_pin'
+
+_state = threading.local()
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', None)
+    if alias and alias in settings.DATABASES:
+        return alias
+    return None
+
+
+def read_replica():
+    """Читал ли текущий запрос с реплики."""
+    return getattr(_state, 'replica_read', False)
+
+
+@contextmanager
+def primary_reads():
+    """Чтения внутри блока идут в default."""
+    saved = getattr(_state, 'replica', False)
+    _state.replica = False
+    try:
+        yield
+    finally:
+        _state.replica = saved
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None or not getattr(_state, 'replica', False):
+            return DEFAULT_DB_ALIAS
+        # Внутри транзакции на запись читаем то же, что пишем
+        if getattr(_state, 'wrote', False) or connections[
+                DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        _state.replica_read = True
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приходит на реплику вместе с данными
+        if db != DEFAULT_DB_ALIAS and db == replica_alias():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Разрешает чтение с реплики и закрепляет писавших за default.
+
+    Стоит до SessionMiddleware, чтобы сохранение сессии тоже считалось
+    записью.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.replica = (
+            replica_alias() is not None
+            and request.method in SAFE_METHODS
+            and REPLICA_PIN_COOKIE not in request.COOKIES
+        )
+        _state.wrote = False
+        _state.replica_read = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.replica = False
+            _state.wrote = False
+            _state.replica_read = False
+        if wrote and replica_alias() is not None:
+            response.set_cookie(
+                REPLICA_PIN_COOKIE, '1', max_age=sticky_seconds(),
+                httponly=True, samesite='Lax')
+        return response
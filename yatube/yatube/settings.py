@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -51,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'yatube.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -88,9 +93,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # Соединение живёт между запросами, PRAGMA выполняются один раз
+        'CONN_MAX_AGE': 600,
+    },
+    # Локальная замена реплики: копия db.sqlite3, см. sync_replica.
+    # В тестах это то же соединение, что и default
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+        'CONN_MAX_AGE': 600,
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+# Выполняются для каждого нового соединения SQLite, см. yatube/sqlite.py
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
 }
 
+# Повторы представления на запись при «database is locked»
+DATABASE_LOCK_RETRIES = 3
+DATABASE_LOCK_BACKOFF = 0.05
+
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+
+# Алиас базы для чтения в GET-запросах; None — всё читается из default
+REPLICA_DATABASE = None
+
+# Сколько секунд после записи браузер читает только из default
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -134,6 +169,16 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки сверх лимита обрываются до записи на диск, см. posts/images.py
+FILE_UPLOAD_HANDLERS = [
+    'posts.images.SizeLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_MAX_PIXELS = 50_000_000
+
 LOGIN_URL = "/auth/login/"
 LOGIN_REDIRECT_URL = "index"
 
@@ -141,9 +186,54 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 PER_PAGE_COUNT = 10
-
+COMMENTS_PER_PAGE = 20
+
+# 'offset' — нумерованные страницы, 'cursor' — ?after=/?before= токены
+FEED_PAGINATION = 'offset'
+
+# Авторы с большим числом подписчиков читаются в ленту напрямую,
+# а не раскладываются по TimelineEntry при публикации
+TIMELINE_FANOUT_LIMIT = 10000
+TIMELINE_BACKFILL = 1000
+
+# Число постов в ленте берётся из кэша; для больших таблиц — из статистики
+# СУБД вместо COUNT(*)
+FEED_COUNT_TIMEOUT = 600
+FEED_COUNT_ESTIMATE_THRESHOLD = 100000
+
+# Поиск по постам, см. posts/search.py
+POST_SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+SEARCH_ADMIN_LIMIT = 1000
+
+# Готовые страницы лент для гостей, см. posts/pagecache.py; 0 — отключить
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 300
+
+# Тесты получают свой каталог кэша и не чистят кэш сервера разработки
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+CACHE_DIR = (
+    tempfile.mkdtemp(prefix='yatube-cache-') if TESTING
+    else os.path.join(BASE_DIR, 'cache'))
+if TESTING:
+    atexit.register(shutil.rmtree, CACHE_DIR, True)
+
+# Локальный LRU каждого воркера перед общим кэшем в SQLite с атомарным
+# incr, см. yatube/cache.py
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'yatube.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'yatube.cache.SQLiteCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'shared.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+            'CULL_EVERY': 100,
+        },
+    },
 }
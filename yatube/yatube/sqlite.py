@@ -0,0 +1,34 @@
+"""Настройка соединений SQLite для нескольких воркеров gunicorn.
+
+PRAGMA из SQLITE_PRAGMAS выполняются при каждом новом соединении
+(сигнал connection_created), а CONN_MAX_AGE в DATABASES держит
+соединение открытым между запросами, поэтому это происходит редко.
+
+* journal_mode=WAL — читатели не ждут писателя и наоборот;
+* busy_timeout — писатель ждёт освобождения блокировки, а не сразу
+  получает «database is locked»;
+* synchronous=NORMAL — в режиме WAL не теряет целостность, но не
+  вызывает fsync на каждую фиксацию;
+* mmap_size — чтение страниц базы через отображение в память.
+"""
+from django.conf import settings
+
+# Режим журнала хранится в файле базы, для :memory: он не меняется
+FILE_ONLY_PRAGMAS = ('journal_mode',)
+
+
+def sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Обработчик connection_created: применяет SQLITE_PRAGMAS."""
+    if connection.vendor != 'sqlite':
+        return
+    in_memory = connection.is_in_memory_db()
+    for name, value in sqlite_pragmas().items():
+        if in_memory and name in FILE_ONLY_PRAGMAS:
+            continue
+        # Через сырое соединение, чтобы PRAGMA не попадали в журнал
+        # запросов и бюджеты представлений
+        connection.connection.execute(f'PRAGMA {name} = {value}')